@@ -0,0 +1,112 @@
+import re
+
+import pandas as pd
+
+from normalization import normalize_text, normalized_values
+
+# Capacities that actually ship on phones; anything else is a price, a phone number or noise
+STORAGE_SIZES = {16, 32, 64, 128, 256, 512, 1024}
+RAM_SIZES = {1, 2, 3, 4, 6, 8, 12, 16, 18, 24}
+
+STORAGE_KEYWORDS = r'(?:(?<![a-z])(?:space|storage|rom|memory)|مساحه|مساحة|مساحته|ذاكره|ذاكرة|زاكره|زاكرة|ذكره)'
+RAM_KEYWORDS = r'(?:(?<![a-z])ram|رام|رامات|راما|رامه|رمات)'
+BATTERY_KEYWORDS = r'(?:battery|battry|بطاريه|بطارية|بطاريته|بطاريتة)'
+# Keeps "battery 5000mAh", "بطاريه32جيجا" and "بطارية 10الف" from reading as health percentages
+NOT_A_UNIT = r'(?!\s*(?:[a-z]|جيجا|الف|ألف|امبير|مللي|ملي))'
+SIZE_UNITS = r'(?:جيجابايت|جيجا بايت|جيجابيت|جيجا|giga|gb|g)(?![a-z])'
+
+STORAGE_PATTERNS = [
+    re.compile(STORAGE_KEYWORDS + r'\s*(?:داخليه|داخلية)?\s*:?\s*(\d+)\s*(tb|تيرا)?'),
+    re.compile(r'(\d+)\s*(tb|تيرا)'),
+    re.compile(r'(\d+)\s*' + SIZE_UNITS + r'(?!\s*' + RAM_KEYWORDS + r')()'),
+]
+RAM_PATTERNS = [
+    re.compile(RAM_KEYWORDS + r'\s*:?\s*(\d+)'),
+    re.compile(r'(\d+)\s*(?:\+\s*\d+\s*)?(?:' + SIZE_UNITS + r')?\s*' + RAM_KEYWORDS),
+]
+# "4/128", "128/4", "(8/256)" style RAM/storage pairs
+PAIR_PATTERN = re.compile(r'(?<![\d/])(\d{1,4})\s*/\s*(\d{1,4})(?![\d/])')
+# Bare capacities are only trusted in titles, e.g. "iPhone xs 256"
+TITLE_STORAGE_PATTERN = re.compile(r'(?<![\d.])(64|128|256|512)(?![\d.%])')
+BATTERY_PATTERNS = [
+    re.compile(BATTERY_KEYWORDS + r'\s*(?:health|هيلث)?\s*:?\s*%?\s*(\d{2,3})(?!\d)' + NOT_A_UNIT),
+    re.compile(r'(?<!\d)(\d{2,3})\s*%\s*' + BATTERY_KEYWORDS),
+]
+PERCENT_PATTERN = re.compile(r'(?:(?<!\d)(\d{2,3})\s*%|%\s*(\d{2,3})(?!\d))')
+# Percentages next to these words are discounts or "100% original", not battery health
+NON_BATTERY_PERCENT = re.compile(r'خصم|discount|off|اصلي|أصلي|original|ضمان')
+
+
+def parse_capacity(text):
+    """Convert a capacity like '128GB', '8 جيجا' or '1TB' to gigabytes"""
+    text = normalize_text(text)
+    match = re.search(r'(\d+)\s*(tb|تيرا)?', text)
+    if not match:
+        return None
+    value = int(match.group(1))
+    return value * 1024 if match.group(2) else value
+
+
+def _storage_gb(text, title=False):
+    for pattern in STORAGE_PATTERNS:
+        for match in pattern.finditer(text):
+            value = int(match.group(1)) * (1024 if match.group(2) else 1)
+            if value in STORAGE_SIZES:
+                return value
+
+    for first, second in PAIR_PATTERN.findall(text):
+        value = max(int(first), int(second))
+        if value in STORAGE_SIZES and min(int(first), int(second)) in RAM_SIZES:
+            return value
+
+    if title:
+        match = TITLE_STORAGE_PATTERN.search(text)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _ram_gb(text):
+    for pattern in RAM_PATTERNS:
+        for match in pattern.finditer(text):
+            value = int(match.group(1))
+            if value in RAM_SIZES:
+                return value
+
+    for first, second in PAIR_PATTERN.findall(text):
+        value = min(int(first), int(second))
+        if value in RAM_SIZES and max(int(first), int(second)) in STORAGE_SIZES:
+            return value
+    return None
+
+
+def _battery_pct(text):
+    for pattern in BATTERY_PATTERNS:
+        for match in pattern.finditer(text):
+            value = int(match.group(1))
+            if 0 < value <= 100:
+                return value
+
+    # Fall back to a bare percentage unless it reads like a discount or a guarantee
+    for match in PERCENT_PATTERN.finditer(text):
+        value = int(match.group(1) or match.group(2))
+        context = text[max(0, match.start() - 12):match.end() + 12]
+        if 50 <= value <= 100 and not NON_BATTERY_PERCENT.search(context):
+            return value
+    return None
+
+
+def enrich_catalog(df):
+    """Add typed storage_gb, ram_gb and battery_pct columns parsed from titles and descriptions"""
+    storage, ram, battery = [], [], []
+
+    # Normalized columns are parsed directly, skipping the per-call normalization
+    for title, description in zip(normalized_values(df, 'title'), normalized_values(df, 'description')):
+        storage.append(_storage_gb(title, title=True) or _storage_gb(description))
+        ram.append(_ram_gb(title) or _ram_gb(description))
+        battery.append(_battery_pct(title) or _battery_pct(description))
+
+    df['storage_gb'] = pd.array(storage, dtype='Int16')
+    df['ram_gb'] = pd.array(ram, dtype='Int16')
+    df['battery_pct'] = pd.array(battery, dtype='Int16')
+    return df
@@ -0,0 +1,83 @@
+import threading
+
+import duckdb
+import pyarrow as pa
+
+# Columns the dashboard aggregates; everything else stays out of the engine
+ANALYTICS_COLUMNS = ['brand', 'location', 'price', 'storage_gb', 'description']
+
+
+class CatalogAnalytics:
+    """Dashboard aggregations over one catalog version, run by an embedded DuckDB engine and memoized
+
+    Results never change for a version, so each query runs once per version instead of on every rerun.
+    """
+
+    def __init__(self, df, version):
+        self.version = version
+        # Arrow-backed strings and categoricals convert without copying their buffers
+        table = pa.Table.from_pandas(df[[column for column in ANALYTICS_COLUMNS if column in df.columns]], preserve_index=False)
+        self._connection = duckdb.connect()
+        self._connection.register('listings', table)
+        self._results = {}
+        # One DuckDB connection is not safe to query from several session threads at once
+        self._lock = threading.Lock()
+
+    def _query(self, sql, params=()):
+        """Rows of a query as a frame, computed on first use"""
+        key = (sql, tuple(params))
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = self._connection.execute(sql, list(params)).df()
+            return self._results[key]
+
+    def summary(self):
+        """Catalog-wide headline figures as a dict"""
+        return self._query("""
+            SELECT
+                count(*) AS listings,
+                median(price::DOUBLE) AS median_price,
+                avg(price::DOUBLE) AS avg_price,
+                quantile_cont(price::DOUBLE, 0.95) AS p95_price,
+                max(price::DOUBLE) AS max_price,
+                count(DISTINCT brand) AS brands,
+                count(DISTINCT location) AS locations,
+                count(DISTINCT storage_gb) AS storage_options,
+                -- RE2's \\d is ASCII-only; listings also write battery health in Arabic-Indic digits
+                avg(CASE WHEN regexp_matches(description, '[0-9٠-٩]+%') THEN 1 ELSE 0 END) AS battery_coverage
+            FROM listings
+        """).to_dict('records')[0]
+
+    def top_brands_share(self, n=5):
+        """Share of branded listings held by the n most listed brands"""
+        row = self._query("""
+            SELECT coalesce(sum(count) FILTER (WHERE rank <= ?) / sum(count), 0) AS share
+            FROM (SELECT count(*) AS count, row_number() OVER (ORDER BY count(*) DESC) AS rank
+                  FROM listings WHERE brand IS NOT NULL GROUP BY brand)
+        """, [n]).iloc[0]
+        return float(row['share'])
+
+    def brand_counts(self, n=10):
+        """Listings per brand, most listed first, counting unbranded listings as Unclassified"""
+        return self._query("""
+            SELECT coalesce(brand, 'Unclassified') AS brand, count(*) AS count
+            FROM listings GROUP BY 1 ORDER BY count DESC, brand LIMIT ?
+        """, [n])
+
+    def brand_median_prices(self, n=8):
+        """Median asking price of the n most expensive brands"""
+        return self._query("""
+            SELECT brand, median(price::DOUBLE) AS median_price
+            FROM listings WHERE brand IS NOT NULL AND price IS NOT NULL
+            GROUP BY brand ORDER BY median_price DESC, brand LIMIT ?
+        """, [n])
+
+    def brands(self, n=40):
+        """First n brand names in alphabetical order"""
+        return self._query(
+            "SELECT DISTINCT brand FROM listings WHERE brand IS NOT NULL ORDER BY brand LIMIT ?", [n]
+        )['brand'].tolist()
+
+    def listings_within(self, budget):
+        """Number of listings priced at or below budget"""
+        return int(self._query("SELECT count(*) AS count FROM listings WHERE price <= ?", [budget]).iloc[0]['count'])
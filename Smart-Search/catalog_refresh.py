@@ -0,0 +1,263 @@
+import argparse
+import os
+import threading
+import time
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from catalog_store import (
+    CATALOG_SCHEMA, CSV_PATH, FORMATS, STRING_DTYPE, catalog_path, convert_catalog, read_catalog, read_csv_catalog,
+)
+from search_index import SearchIndex
+
+# OLX ad URLs end in "...-ID200349076.html"; the ID survives title edits that change the slug
+AD_ID = r'ID(\d+)\.html'
+RAW_COLUMNS = [field.name for field in CATALOG_SCHEMA]
+# Past either limit a refresh rebuilds from the snapshot instead of appending another segment
+MAX_DEAD_FRACTION = 0.2
+MAX_SEGMENTS = 8
+
+
+def listing_keys(df):
+    """Key per listing: its ad ID (or URL), numbered when a snapshot repeats the same ad"""
+    urls = df['product_url'].astype(object).astype(str)
+    ids = urls.str.extract(AD_ID, expand=False).fillna(urls)
+    return (ids + '#' + ids.groupby(ids).cumcount().astype(str)).to_numpy(dtype=object)
+
+
+def row_digests(df):
+    """Hash of each listing's scraped fields, the same whether the columns are raw or compacted"""
+    raw = pd.DataFrame({
+        column: df[column].astype('float64') if column == 'price' else df[column].astype(object).where(df[column].notna(), None)
+        for column in RAW_COLUMNS
+    })
+    return pd.util.hash_pandas_object(raw, index=False).to_numpy()
+
+
+def source_mtime(path=None):
+    """Modification time of the catalog file load_data would read, or None if there is none"""
+    path = path or catalog_path()
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+class Catalog:
+    """One immutable catalog version: the rows, their search index and per-row listing keys and digests
+
+    Rows are only ever appended; deleted and superseded rows stay in `frame` and are masked by `index.live`.
+    """
+
+    def __init__(self, frame, index, keys=None, digests=None, mtime=None, generation=0):
+        self.frame = frame
+        self.index = index
+        self.keys = listing_keys(frame) if keys is None else keys
+        self.digests = row_digests(frame) if digests is None else digests
+        self.mtime = mtime
+        # Full rebuilds since startup; appends keep the row positions of earlier versions
+        self.generation = generation
+        self.live = np.ones(len(frame), dtype=bool) if index.live is None else index.live
+
+    @cached_property
+    def listings(self):
+        """Current listings only, for views that summarise the catalog rather than search it"""
+        # Built on first use: copying the live rows costs as much as the whole catalog, which a refresh should not pay
+        return self.frame if self.index.live is None else self.frame[self.index.live]
+
+
+class Delta:
+    """Changes between a catalog version and a new snapshot"""
+
+    def __init__(self, inserted, updated, deleted, superseded, keys, digests):
+        self.inserted = inserted      # snapshot positions of new listings
+        self.updated = updated        # snapshot positions of listings whose content changed
+        self.deleted = deleted        # catalog rows missing from the snapshot
+        self.superseded = superseded  # catalog rows replaced by an updated listing
+        self.keys = keys
+        self.digests = digests
+
+    @property
+    def appended(self):
+        """Snapshot positions to add as new catalog rows, in snapshot order"""
+        return np.sort(np.concatenate([self.inserted, self.updated]))
+
+    @property
+    def retired(self):
+        """Catalog rows that stop being live"""
+        return np.sort(np.concatenate([self.deleted, self.superseded]))
+
+    def __len__(self):
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+    def summary(self):
+        return {'inserted': len(self.inserted), 'updated': len(self.updated), 'deleted': len(self.deleted)}
+
+
+def compute_delta(catalog, snapshot):
+    """Inserts, updates and deletes of a snapshot against the live rows of a catalog version"""
+    keys = listing_keys(snapshot)
+    digests = row_digests(snapshot)
+    current = pd.Series(np.flatnonzero(catalog.live), index=catalog.keys[catalog.live])
+    incoming = pd.Series(np.arange(len(snapshot)), index=keys)
+
+    known = incoming.index.isin(current.index)
+    common = incoming[known]
+    rows = current.reindex(common.index).to_numpy()
+    changed = catalog.digests[rows] != digests[common.to_numpy()]
+    return Delta(
+        inserted=incoming.to_numpy()[~known],
+        updated=common.to_numpy()[changed],
+        deleted=current.to_numpy()[~current.index.isin(incoming.index)],
+        superseded=rows[changed],
+        keys=keys,
+        digests=digests,
+    )
+
+
+def append_rows(frame, rows):
+    """Frame with rows appended after its last row, keeping every column's dtype
+
+    This copies every column of the frame, so it costs time proportional to the whole catalog, not to the rows added.
+    """
+    head, tail = {}, {}
+    for column in frame.columns:
+        old = frame[column]
+        new = rows[column] if column in rows.columns else pd.Series(None, index=rows.index, dtype=object)
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            # Existing codes stay valid; values seen for the first time become new categories
+            unseen = pd.Index(new.dropna().astype(object).unique()).difference(old.cat.categories)
+            old = old.cat.add_categories(unseen)
+            new = pd.Series(pd.Categorical(new.astype(object), dtype=old.dtype), index=rows.index)
+        else:
+            new = new.astype(old.dtype)
+        head[column] = old
+        tail[column] = new
+    tail = pd.DataFrame(tail).set_axis(pd.RangeIndex(len(frame), len(frame) + len(rows)))
+    combined = pd.concat([pd.DataFrame(head), tail])
+    for column in combined.columns:
+        if combined[column].dtype == STRING_DTYPE:
+            # One Arrow chunk per column: taking rows from a chunked array concatenates it on every query
+            chunks = pa.array(combined[column].array).combine_chunks()
+            combined[column] = pd.Series(pd.arrays.ArrowStringArray(pa.chunked_array([chunks])), index=combined.index)
+    return combined
+
+
+class LiveCatalog:
+    """The current catalog version, replaced atomically when a new snapshot is merged in
+
+    Queries read `current` once and keep that version until they finish, so a refresh never changes rows under them.
+    """
+
+    def __init__(self, catalog, prepare):
+        self.current = catalog
+        # Raw snapshot rows -> normalized, typed and tagged rows as load_data builds them
+        self.prepare = prepare
+        self._lock = threading.Lock()
+        self._starting = threading.Lock()
+        self.refreshing = False
+        self.failed_mtime = None
+        self.error = None
+        self.last_refresh = None
+
+    def refresh(self, snapshot, mtime=None):
+        """Merge a full snapshot into the current version and swap the result in; returns a report"""
+        with self._lock:
+            began = time.perf_counter()
+            current = self.current
+            delta = compute_delta(current, snapshot)
+            retired = np.count_nonzero(~current.live) + len(delta.retired)
+            mode = 'unchanged'
+            if not len(delta):
+                catalog = Catalog(current.frame, current.index, current.keys, current.digests, mtime, current.generation)
+            elif (retired / (len(current.frame) + len(delta.appended)) > MAX_DEAD_FRACTION
+                  or current.index.segments >= MAX_SEGMENTS):
+                # Too many masked rows or segments: start over from the snapshot
+                mode = 'rebuild'
+                frame = self.prepare(snapshot.reset_index(drop=True))
+                catalog = Catalog(frame, SearchIndex(frame), delta.keys, delta.digests, mtime, current.generation + 1)
+            else:
+                mode = 'append'
+                appended = delta.appended
+                frame = append_rows(current.frame, self.prepare(snapshot.iloc[appended].reset_index(drop=True)))
+                catalog = Catalog(
+                    frame,
+                    current.index.extended(frame, len(current.frame), delta.retired),
+                    np.concatenate([current.keys, delta.keys[appended]]),
+                    np.concatenate([current.digests, delta.digests[appended]]),
+                    mtime,
+                    current.generation,
+                )
+            # A single reference swap: readers see either the old version or the new one, never a mix
+            self.current = catalog
+
+            self.last_refresh = {
+                'mode': mode,
+                **delta.summary(),
+                'listings': int(np.count_nonzero(catalog.live)),
+                'rows': len(catalog.frame),
+                'version': catalog.index.version,
+                'seconds': time.perf_counter() - began,
+            }
+            return self.last_refresh
+
+    def refresh_if_changed(self):
+        """Merge the catalog file on a background thread if it changed since the current version was loaded"""
+        path = catalog_path()
+        mtime = source_mtime(path)
+        with self._starting:
+            if mtime is None or self.refreshing or mtime in (self.current.mtime, self.failed_mtime):
+                return False
+            self.refreshing = True
+        threading.Thread(target=self._refresh_from, args=(path, mtime), name='catalog-refresh', daemon=True).start()
+        return True
+
+    def _refresh_from(self, path, mtime):
+        try:
+            self.refresh(read_catalog(path), mtime)
+            self.error = None
+        except Exception as exc:
+            # Not retried until the file changes again
+            self.error = exc
+            self.failed_mtime = mtime
+        finally:
+            self.refreshing = False
+
+
+def publish_snapshot(path, csv_path=CSV_PATH):
+    """Replace the catalog CSV with a new snapshot, and any columnar copies with it, for running apps to merge"""
+    snapshot = read_csv_catalog(path)
+    partial = csv_path + '.tmp'
+    snapshot.to_csv(partial, index=False, encoding='utf-8')
+    os.replace(partial, csv_path)
+    # A stale columnar copy would otherwise be ignored in favour of the CSV; keep the fast path
+    for fmt, columnar in FORMATS.items():
+        if os.path.exists(columnar):
+            convert_catalog(csv_path, columnar, fmt)
+    return len(snapshot)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incremental catalog refresh from a new scrape")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    diff = subcommands.add_parser('diff', help="Delta of a snapshot against the current catalog, and refresh vs rebuild time")
+    diff.add_argument('snapshot')
+    publish = subcommands.add_parser('publish', help="Make a snapshot the catalog; running apps merge it incrementally")
+    publish.add_argument('snapshot')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        print(f"Published {publish_snapshot(args.snapshot):,} listings to {CSV_PATH}"
+              f"{' (and columnar copies)' if any(os.path.exists(path) for path in FORMATS.values()) else ''}")
+    else:
+        from utils import load_data, prepare_catalog
+
+        frame = load_data()
+        live = LiveCatalog(Catalog(frame, SearchIndex(frame)), prepare_catalog)
+        new_snapshot = read_catalog(args.snapshot)
+        report = live.refresh(new_snapshot)
+        print(f"{report['inserted']:,} inserted, {report['updated']:,} updated, {report['deleted']:,} deleted "
+              f"-> {report['mode']} in {report['seconds']:.2f} s ({report['listings']:,} listings, version {report['version']})")
+        began = time.perf_counter()
+        SearchIndex(prepare_catalog(new_snapshot))
+        print(f"Full rebuild of the same snapshot: {time.perf_counter() - began:.2f} s")
@@ -0,0 +1,163 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+CSV_PATH = 'data/olx_products_cleaned.csv'
+PARQUET_PATH = 'data/olx_products_cleaned.parquet'
+ARROW_PATH = 'data/olx_products_cleaned.arrow'
+FORMATS = {'parquet': PARQUET_PATH, 'arrow': ARROW_PATH}
+
+# Explicit column types, so no reader has to infer them from the text
+CATALOG_SCHEMA = pa.schema([
+    ('title', pa.string()),
+    ('price', pa.float64()),
+    ('location', pa.string()),
+    ('product_url', pa.string()),
+    ('main_image', pa.string()),
+    ('brand', pa.string()),
+    ('description', pa.string()),
+    ('seller_name', pa.string()),
+])
+CSV_DTYPES = {field.name: 'float64' if field.type == pa.float64() else 'object' for field in CATALOG_SCHEMA}
+
+# In memory: few distinct values become categoricals, other text is stored in Arrow buffers, not Python objects
+CATEGORICAL_COLUMNS = ('brand', 'location', 'seller_name')
+STRING_DTYPE = pd.StringDtype('pyarrow')
+# Asking prices are whole pounds well below 2**24, so float32 holds them exactly
+PRICE_DTYPE = 'float32'
+
+
+def read_csv_catalog(path=CSV_PATH, columns=None):
+    """Read the CSV with the catalog dtypes, parsing only the requested columns"""
+    return pd.read_csv(path, usecols=columns, dtype=CSV_DTYPES)
+
+
+def convert_catalog(csv_path=CSV_PATH, output_path=None, fmt='parquet'):
+    """Write the CSV catalog as Parquet (zstd) or Arrow IPC (uncompressed, so it can be memory-mapped)"""
+    output_path = output_path or FORMATS[fmt]
+    table = pa.Table.from_pandas(read_csv_catalog(csv_path), schema=CATALOG_SCHEMA, preserve_index=False)
+    # Written under a temporary name so a reader never sees a half-written file
+    partial = output_path + '.tmp'
+    if fmt == 'parquet':
+        pq.write_table(table, partial, compression='zstd')
+    else:
+        with pa.OSFile(partial, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(partial, output_path)
+    return output_path
+
+
+def catalog_path(csv_path=CSV_PATH):
+    """Columnar copy of the catalog if one is at least as new as the CSV, else the CSV itself"""
+    csv_mtime = os.path.getmtime(csv_path) if os.path.exists(csv_path) else 0
+    for path in (ARROW_PATH, PARQUET_PATH):
+        if os.path.exists(path) and os.path.getmtime(path) >= csv_mtime:
+            return path
+    return csv_path
+
+
+def read_catalog(path=None, columns=None):
+    """Load the catalog from Arrow IPC, Parquet or CSV, reading only the requested columns"""
+    path = path or catalog_path()
+    if path.endswith('.arrow'):
+        # Mapping the file reads no pages; to_pandas then copies only the selected columns out of the map
+        table = ipc.open_file(pa.memory_map(path)).read_all()
+        return (table.select(columns) if columns else table).to_pandas()
+    if path.endswith('.parquet'):
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return read_csv_catalog(path, columns)
+
+
+def compact_catalog(df):
+    """Categoricals for low-cardinality text, float32 prices and Arrow-backed strings for the rest"""
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype('category')
+        elif column == 'price':
+            df[column] = df[column].astype(PRICE_DTYPE)
+        elif df[column].dtype == object:
+            df[column] = df[column].astype(STRING_DTYPE)
+    return df
+
+
+def memory_report(df, scale=1):
+    """Per-column dtype and memory footprint, with a projection for a catalog scale times larger"""
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'mb': usage / 2 ** 20,
+        'bytes_per_row': usage / max(len(df), 1),
+    })
+    report['share'] = report['mb'] / report['mb'].sum()
+    report[f'mb_x{scale}'] = report['mb'] * scale
+    return report.sort_values('mb', ascending=False)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(path, columns):
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    df = read_catalog(path, columns)
+    seconds = time.perf_counter() - start
+    return seconds, _peak_rss_mb() - baseline, df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def benchmark(paths, columns=None, repeats=3):
+    """Load time, peak RSS growth and frame size per file, each load in a fresh process"""
+    context = multiprocessing.get_context('spawn')
+    reports = {}
+    for path in paths:
+        runs = []
+        for repeat in range(repeats):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(_measure, (path, columns)))
+        reports[path] = {
+            'load_s': min(run[0] for run in runs),
+            'peak_rss_mb': min(run[1] for run in runs),
+            'frame_mb': runs[0][2],
+        }
+    return reports
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Columnar copies of the cleaned catalog")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    convert = subcommands.add_parser('convert', help="Write the CSV catalog as Parquet or Arrow IPC")
+    convert.add_argument('--csv', default=CSV_PATH)
+    convert.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    convert.add_argument('--output')
+    bench = subcommands.add_parser('bench', help="Compare load time and memory of the CSV and columnar files")
+    bench.add_argument('--columns', nargs='+', help="Only load these columns")
+    bench.add_argument('--repeats', type=int, default=3)
+    memory = subcommands.add_parser('memory', help="Per-column memory of the catalog as the app holds it")
+    memory.add_argument('--scale', type=int, default=10, help="Project the footprint for a catalog this many times larger")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        written = convert_catalog(args.csv, args.output, args.format)
+        print(f"Wrote {written} ({os.path.getsize(written) / 2 ** 20:.1f} MB)")
+    elif args.command == 'memory':
+        from utils import load_data
+
+        catalog = load_data()
+        report = memory_report(catalog, args.scale)
+        print(report.to_string(float_format=lambda value: f"{value:,.2f}"))
+        print(f"{len(catalog):,} rows, {report['mb'].sum():,.1f} MB in memory, "
+              f"~{report[f'mb_x{args.scale}'].sum():,.0f} MB at {args.scale}x")
+    else:
+        existing = [path for path in (CSV_PATH, PARQUET_PATH, ARROW_PATH) if os.path.exists(path)]
+        print(f"{'file':<36} {'size MB':>8} {'load s':>8} {'peak RSS MB':>12} {'frame MB':>9}")
+        for name, report in benchmark(existing, args.columns, args.repeats).items():
+            print(f"{name:<36} {os.path.getsize(name) / 2 ** 20:>8.1f} {report['load_s']:>8.3f} "
+                  f"{report['peak_rss_mb']:>12.1f} {report['frame_mb']:>9.1f}")
@@ -0,0 +1,245 @@
+import re
+
+from attributes import BATTERY_KEYWORDS, RAM_KEYWORDS, RAM_SIZES, SIZE_UNITS, STORAGE_KEYWORDS, STORAGE_SIZES
+from gazetteer import GAZETTEER
+from normalization import normalize_text
+
+# Fields a range can constrain and the catalog column each one is compared against
+RANGE_COLUMNS = {'price': 'price', 'battery': 'battery_pct', 'storage': 'storage_gb', 'ram': 'ram_gb'}
+MULTIPLIERS = {'k': 1000, 'الف': 1000, 'الاف': 1000}
+
+
+def _words(*alternatives):
+    # Letters may not follow, digits may ("تحت20000", "فوق80")
+    return r'(?:' + '|'.join(alternatives) + r')(?![^\W\d_])'
+
+
+# Token kinds, tried in order at each position; one finditer pass splits a query into these
+TOKEN_KINDS = [
+    ('MAX', _words(
+        'less than', 'lower than', 'cheaper than', 'under', 'below', 'up to', 'at most', 'no more than',
+        'maximum', 'max', 'budget', 'اقل من', 'تحت', 'لحد', 'لغايه', 'بحد اقصي', 'حد اقصي', 'اقصي',
+        'مش اكتر من', 'ميزانيه',
+    ) + r'|<=?'),
+    ('MIN', _words(
+        'more than', 'greater than', 'higher than', 'above', 'over', 'at least', 'minimum', 'min',
+        'فوق', 'اكتر من', 'اكثر من', 'اعلي من', 'علي الاقل', 'لا يقل عن',
+    ) + r'|>=?'),
+    ('BETWEEN', _words('between', 'from', 'بين', 'من')),
+    ('OR_LESS', _words('or less', 'or below', 'او اقل')),
+    ('OR_MORE', _words('or more', 'or above', 'او اكتر', 'او اكثر', 'وما فوق', 'فيما فوق') + r'|\+(?!\s*\d)'),
+    ('AND', _words('and', 'to', 'till', 'until', 'الي', 'و', 'ل') + r'|[-–]'),
+    ('NUMBER', r'\d+(?:\.\d+)?'),
+    ('MULT', _words('k', 'الف', 'الاف')),
+    ('PERCENT', r'%'),
+    ('TB', _words('tb', 'تيرا')),
+    ('GB', SIZE_UNITS),
+    ('CURRENCY', _words('egp', 'le', 'pounds', 'pound', 'جنيه', 'ج')),
+    ('BATTERY', BATTERY_KEYWORDS),
+    ('RAM', RAM_KEYWORDS),
+    ('STORAGE', STORAGE_KEYWORDS),
+    ('PRICE', _words('price', 'سعر', 'السعر', 'بسعر')),
+    ('WORD', r'[^\W\d_]+'),
+    ('OTHER', r'\S'),
+]
+TOKEN_PATTERN = re.compile('|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in TOKEN_KINDS))
+FIELD_KEYWORDS = {'BATTERY': 'battery', 'RAM': 'ram', 'STORAGE': 'storage', 'PRICE': 'price'}
+# Upper-bound words that can also follow the number: "20000 max"
+POSTFIX_MAX = {'max', 'maximum', 'اقصي', 'حد اقصي', 'بحد اقصي'}
+# Product line and suffix words; "max" right after one of them or a number is part of a model name ("11 pro max")
+MODEL_WORDS = {surface for (label, _), surfaces in GAZETTEER.synonyms.items() if label in ('FAMILY', 'SUFFIX') for surface in surfaces}
+# How many tokens an operator or keyword may sit before the number it applies to
+REACH = 2
+
+
+class Constraint:
+    """Inclusive numeric range on one field, with its character span in the normalized query"""
+
+    def __init__(self, field, low, high, start, end):
+        self.field = field
+        self.low = low
+        self.high = high
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Constraint({self.field!r}, {self.low!r}, {self.high!r})"
+
+
+def _quantity(tokens, position):
+    """Read NUMBER [MULT] [unit]; returns (value, unit, scale, next position)"""
+    value = float(tokens[position][1])
+    position += 1
+    unit = None
+    scale = 1
+    if position < len(tokens) and tokens[position][0] == 'MULT':
+        scale = MULTIPLIERS[tokens[position][1]]
+        unit = 'MULT'
+        position += 1
+    if position < len(tokens) and tokens[position][0] in ('PERCENT', 'TB', 'GB', 'CURRENCY'):
+        unit = tokens[position][0]
+        if unit == 'TB':
+            scale = 1024
+        position += 1
+    value *= scale
+    return int(value) if value == int(value) else value, unit, scale, position
+
+
+def _field(unit, hint, value, operator):
+    """Decide which field a quantity constrains from its unit, a nearby keyword, or its size"""
+    if unit == 'PERCENT':
+        return 'battery'
+    if unit in ('MULT', 'CURRENCY'):
+        return 'price'
+    if unit in ('GB', 'TB'):
+        if hint in ('ram', 'storage'):
+            return hint
+        return 'ram' if value in RAM_SIZES and value not in STORAGE_SIZES else 'storage'
+    if hint:
+        return hint
+    # A bare number: budgets are large, battery health is a percentage
+    if operator == 'MAX' or value > 100:
+        return 'price'
+    if operator is not None:
+        return 'battery'
+    return None
+
+
+def _valid(field, value):
+    if field == 'battery':
+        return 0 < value <= 100
+    if field == 'ram':
+        return 0 < value <= 64
+    return value > 0
+
+
+def _number_within_reach(tokens, position):
+    """Whether a NUMBER token starts within REACH tokens after position"""
+    return any(kind == 'NUMBER' for kind, *_ in tokens[position + 1:position + 1 + REACH])
+
+
+def extract_constraints(text):
+    """Numeric min/max/between constraints on price, battery, storage and RAM in a query"""
+    text = normalize_text(text)
+    tokens = [(match.lastgroup, match.group(), match.start(), match.end()) for match in TOKEN_PATTERN.finditer(text)]
+    constraints = []
+    operator = hint = None
+    operator_at = hint_at = -REACH - 1
+    operator_start = hint_start = 0
+    position = 0
+
+    while position < len(tokens):
+        kind, word, start, _ = tokens[position]
+        if kind == 'MAX' and word in POSTFIX_MAX and position and tokens[position - 1][1] in MODEL_WORDS:
+            # "iphone 11 pro max 256" names a model; the 256 is not a price ceiling
+            position += 1
+            continue
+        if kind in ('MAX', 'MIN', 'BETWEEN'):
+            operator, operator_at, operator_start = kind, position, start
+            position += 1
+            continue
+        if kind in FIELD_KEYWORDS:
+            hint, hint_at, hint_start = FIELD_KEYWORDS[kind], position, start
+            position += 1
+            continue
+        if kind != 'NUMBER':
+            position += 1
+            continue
+
+        current = operator if position - operator_at <= REACH else None
+        field_hint = hint if position - hint_at <= REACH else None
+        span_start = min(
+            operator_start if current else start,
+            hint_start if field_hint else start,
+        )
+        value, unit, _, after = _quantity(tokens, position)
+        low = high = value
+
+        # "between 10 and 20k", "من 10 ل 15 الف", "10-20k"
+        connector = after + 1 < len(tokens) and tokens[after + 1][0] == 'NUMBER' and (
+            (current == 'BETWEEN' and tokens[after][0] in ('AND', 'MAX')) or tokens[after][1] in ('-', '–')
+        )
+        if connector:
+            second, second_unit, scale, after = _quantity(tokens, after + 1)
+            if unit is None and second_unit is not None:
+                # The unit is usually written once: "between 10 and 20 الف"
+                unit = second_unit
+                if value * scale <= second:
+                    value *= scale
+            low, high = sorted((value, second))
+            current = 'BETWEEN'
+        elif current == 'BETWEEN':
+            # "من" without a second bound is just "from", not a range
+            current = None
+            span_start = hint_start if field_hint else start
+
+        # Postfix operators and keywords, in either order: "20k or less", "8gb ram or more", "80% battery"
+        postfix_hint = False
+        while after < len(tokens):
+            following, word = tokens[after][:2]
+            if following in ('OR_LESS', 'OR_MORE'):
+                current = 'MAX' if following == 'OR_LESS' else 'MIN'
+            elif (following == 'MAX' and word in POSTFIX_MAX and current is None and (unit or high > 100)
+                  and not _number_within_reach(tokens, after)):
+                # Only with a unit or a price-sized number, so "iphone 13 max" stays a model name;
+                # with a number of its own after it, it bounds that one instead: "128gb max 25000"
+                current = 'MAX'
+            elif following in FIELD_KEYWORDS and not field_hint and (unit or not _number_within_reach(tokens, after)):
+                # A keyword with its own number after it belongs to that number: "iphone 13 battery 88"
+                field_hint = FIELD_KEYWORDS[following]
+                postfix_hint = True
+            else:
+                break
+            after += 1
+
+        field = _field(unit, field_hint, high, current)
+        if postfix_hint and field == field_hint and not (_valid(field, low) and _valid(field, high)):
+            # "between 10000 and 20000 battery": the keyword cannot describe the number, so its unit or size decides
+            field = _field(unit, None, high, current)
+        if field == 'battery' and current is None:
+            # "battery 80%" means at least 80%
+            current = 'MIN'
+        if field and current and _valid(field, low) and _valid(field, high):
+            if current == 'MAX':
+                low = None
+            elif current == 'MIN':
+                high = None
+            constraints.append(Constraint(field, low, high, span_start, tokens[after - 1][3]))
+            operator = hint = None
+            operator_at = hint_at = -REACH - 1
+        position = after
+
+    return constraints
+
+
+def constraint_ranges(constraints):
+    """Merge constraints into {field: [low, high]}, intersecting repeated fields"""
+    ranges = {}
+    for constraint in constraints:
+        low, high = ranges.get(constraint.field, (None, None))
+        if constraint.low is not None:
+            low = constraint.low if low is None else max(low, constraint.low)
+        if constraint.high is not None:
+            high = constraint.high if high is None else min(high, constraint.high)
+        ranges[constraint.field] = [low, high]
+    return ranges
+
+
+def query_ranges(parsed_query):
+    """Ranges of a parsed query, including price_max/battery_min set without a range"""
+    ranges = dict(parsed_query.get('ranges') or {})
+    if parsed_query.get('price_max') and 'price' not in ranges:
+        ranges['price'] = [None, parsed_query['price_max']]
+    if parsed_query.get('battery_min') and 'battery' not in ranges:
+        ranges['battery'] = [parsed_query['battery_min'], None]
+    return ranges
+
+
+def range_label(field, low, high):
+    """Filter label for inclusive bounds on a field, e.g. Price ≤ 20,000 EGP"""
+    name, unit = {'price': ('Price', ' EGP'), 'battery': ('Battery', '%'), 'storage': ('Storage', ' GB'), 'ram': ('RAM', ' GB')}[field]
+    if low is None:
+        return f"{name} ≤ {high:,}{unit}"
+    if high is None:
+        return f"{name} ≥ {low:,}{unit}"
+    return f"{name} {low:,}–{high:,}{unit}"
@@ -0,0 +1,230 @@
+import re
+from collections import deque
+
+import pandas as pd
+
+from normalization import normalize_text, normalized_values, split_tokens
+
+# Canonical value -> spellings, per entity label; spellings are normalized when the automaton is built
+ENTRIES = {
+    'BRAND': {
+        'Apple': ['apple', 'ابل', 'iphone', 'ايفون', 'i phone'],
+        'Samsung': ['samsung', 'سامسونج', 'سامسونغ'],
+        'Xiaomi': ['xiaomi', 'شاومي', 'شياومي'],
+        'Huawei': ['huawei', 'هواوي'],
+        'OPPO': ['oppo', 'اوبو'],
+        'OnePlus': ['oneplus', 'one plus', 'ون بلس', 'وان بلس'],
+        'Realme': ['realme', 'ريلمي', 'ريل مي'],
+        'Nokia': ['nokia', 'نوكيا'],
+        'Infinix': ['infinix', 'انفنكس', 'انفينكس'],
+        'Vivo': ['vivo', 'فيفو'],
+        'Honor': ['honor', 'هونر', 'اونر'],
+        'Lenovo': ['lenovo', 'لينوفو'],
+        'Google': ['google', 'جوجل'],
+        'Tecno': ['tecno', 'تكنو'],
+        'Sony': ['sony', 'سوني'],
+        'Motorola': ['motorola', 'موتورولا'],
+        'HTC': ['htc'],
+        'LG': ['lg'],
+        'Alcatel': ['alcatel', 'الكاتيل'],
+        'BlackBerry': ['blackberry', 'black berry', 'بلاك بيري'],
+        'ASUS': ['asus', 'اسوس'],
+        'ZTE': ['zte'],
+    },
+    # Product lines; a model key is the brand, the line and the number that follows it (see FAMILY_LINES)
+    'FAMILY': {
+        'iphone': ['iphone', 'ايفون', 'i phone'],
+        'galaxy': ['galaxy', 'جالاكسي', 'جلاكسي', 'جالكسي'],
+        'redmi note': ['redmi note', 'ريدمي نوت'],
+        'redmi': ['redmi', 'ريدمي'],
+        'note': ['note', 'نوت'],
+        'poco': ['poco', 'بوكو'],
+        'reno': ['reno', 'رينو'],
+        'nova': ['nova', 'نوفا'],
+        'mate': ['mate', 'ميت'],
+        'pixel': ['pixel', 'بيكسل'],
+    },
+    # Words after the model number that narrow it down ("pro", "ماكس")
+    'SUFFIX': {
+        'pro': ['pro', 'برو'],
+        'max': ['max', 'ماكس', 'مكس'],
+        'plus': ['plus', 'بلس'],
+        'ultra': ['ultra', 'الترا'],
+        'mini': ['mini', 'ميني'],
+        'lite': ['lite', 'لايت'],
+    },
+    'COLOR': {
+        'white': ['white', 'ابيض', 'وايت'],
+        'black': ['black', 'اسود', 'بلاك'],
+        'blue': ['blue', 'ازرق', 'لبني', 'sierra blue'],
+        'red': ['red', 'احمر'],
+        'green': ['green', 'اخضر'],
+        'gold': ['gold', 'ذهبي', 'دهبي', 'جولد'],
+        'silver': ['silver', 'فضي', 'سيلفر'],
+        'gray': ['gray', 'grey', 'رمادي', 'graphite', 'جرافيت'],
+        'purple': ['purple', 'بنفسجي', 'موف'],
+        'pink': ['pink', 'وردي', 'بينك'],
+        'yellow': ['yellow', 'اصفر'],
+        'orange': ['orange', 'برتقالي'],
+    },
+    'CONDITION': {
+        'new': ['new', 'brand new', 'جديد'],
+        'sealed': ['sealed', 'متبرشم', 'بكرتونته'],
+        'like new': ['like new', 'open box', 'كسر زيرو', 'زيرو', 'استعمال خفيف'],
+        'used': ['used', 'مستعمل'],
+        'refurbished': ['refurbished'],
+    },
+}
+# Digits after a product line; storage sizes ("iphone 64gb") are not model numbers
+MODEL_NUMBER = re.compile(r'\s?([a-z]{0,2})\s?(\d{1,2})(?![\d%])(?!\s*(?:gb|g|tb|جيجا|تيرا)(?![a-z]))')
+# Brand and line each product line stands for in a model key. Umbrella names (iPhone, Galaxy, Pixel) add nothing to
+# the brand, and "redmi note 12" and "note 12" are one phone, so one spelling of a model never splits its listings
+FAMILY_LINES = {
+    'iphone': ('Apple', ''),
+    'galaxy': ('Samsung', ''),
+    'redmi note': ('Xiaomi', 'note'),
+    'redmi': ('Xiaomi', 'redmi'),
+    'note': (None, 'note'),
+    'poco': ('Xiaomi', 'poco'),
+    'reno': ('OPPO', 'reno'),
+    'nova': ('Huawei', 'nova'),
+    'mate': ('Huawei', 'mate'),
+    'pixel': ('Google', ''),
+}
+# A letter-and-digits code names a model without a line word once the brand is known ("samsung a54", "s23")
+MODEL_CODE = re.compile(r'(?<![^\W_])[a-z]\d{2,3}[a-z]?(?![^\W_])')
+# Bump when the model key format changes so entity files tagged with older keys are not merged
+MODEL_KEY_FORMAT = 2
+
+
+class Gazetteer:
+    """Aho-Corasick automaton over normalized synonym phrases, each tagged with a label and a canonical value"""
+
+    def __init__(self, entries=ENTRIES):
+        self.synonyms = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        for label, groups in entries.items():
+            for canonical, spellings in groups.items():
+                surfaces = list(dict.fromkeys(normalize_text(text) for text in [canonical, *spellings]))
+                self.synonyms[label, canonical] = surfaces
+                for surface in surfaces:
+                    self._add(surface, (label, canonical, len(surface)))
+        self._link()
+
+    def _add(self, phrase, output):
+        state = 0
+        for char in phrase:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._outputs[state].append(output)
+
+    def _link(self):
+        # Breadth-first failure links; each state also emits the outputs of its longest proper suffix
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def scan(self, text):
+        """Every whole-word match in normalized text as (start, end, label, canonical), in one pass"""
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for label, canonical, length in self._outputs[state]:
+                start, end = position - length + 1, position + 1
+                # Letters may not touch a match on either side; digits may follow ("نوت12")
+                if (start == 0 or not text[start - 1].isalpha()) and (end == len(text) or not text[end].isalpha()):
+                    matches.append((start, end, label, canonical))
+        return matches
+
+    def tag(self, text, labels=None):
+        """Leftmost-longest, non-overlapping matches per label in normalized text"""
+        chosen = []
+        taken = {}
+        for start, end, label, canonical in sorted(self.scan(text), key=lambda match: (match[0], match[0] - match[1])):
+            if labels is not None and label not in labels:
+                continue
+            if start < taken.get(label, 0):
+                continue
+            taken[label] = end
+            chosen.append((start, end, label, canonical))
+        return chosen
+
+    def first(self, text, label):
+        """Canonical value of the first match for a label in raw text, or None"""
+        for _, _, _, canonical in self.tag(normalize_text(text), {label}):
+            return canonical
+        return None
+
+    def model_key(self, normalized, brand=None):
+        """Brand, line and model number ("apple 13", "xiaomi note 12", "samsung s23"), and the span it covers
+
+        brand is the canonical brand of the listing or query; lines that belong to one brand do not need it.
+        """
+        for start, end, _, family in self.tag(normalized, {'FAMILY'}):
+            match = MODEL_NUMBER.match(normalized, end)
+            if match:
+                family_brand, line = FAMILY_LINES[family]
+                owner = family_brand or brand
+                if owner is None:
+                    # "note 10" alone could be a Samsung or a Xiaomi
+                    return None, None
+                return ' '.join(filter(None, (owner.lower(), line, match.group(1) + match.group(2)))), (start, match.end())
+        match = MODEL_CODE.search(normalized) if brand else None
+        if match:
+            return f"{brand.lower()} {match.group(0)}", match.span()
+        return None, None
+
+
+GAZETTEER = Gazetteer()
+
+
+def canonical_brand(text):
+    """Catalog brand name for a brand mention, or None if the gazetteer does not know it"""
+    return GAZETTEER.first(text, 'BRAND')
+
+
+def model_key(text, brand=None):
+    """Model key of raw text, given the brand it was named with if any, and the tokens of text it does not cover"""
+    normalized = normalize_text(text)
+    key, span = GAZETTEER.model_key(normalized, canonical_brand(brand) if brand else None)
+    if key is None:
+        return None, split_tokens(normalized)
+    return key, split_tokens(normalized[:span[0]] + ' ' + normalized[span[1]:])
+
+
+def tag_catalog(df):
+    """Add categorical brand_key and model_key columns tagged once with the gazetteer"""
+    # The brand column has few distinct values, so each is tagged once; unknown brands keep their name
+    brand_names = {name: canonical_brand(name) or name for name in df['brand'].dropna().unique()}
+    titles = normalized_values(df, 'title')
+    brands = []
+    for brand, title in zip(df['brand'].tolist(), titles):
+        key = brand_names.get(brand) if isinstance(brand, str) else None
+        if key is None or key == 'Other brand':
+            # Untagged listings fall back to a brand named in the title
+            tags = GAZETTEER.tag(title, {'BRAND'})
+            key = tags[0][3] if tags else key
+        brands.append(key)
+
+    df['brand_key'] = pd.Categorical(brands)
+    known = set(ENTRIES['BRAND'])
+    df['model_key'] = pd.Categorical([
+        GAZETTEER.model_key(title, brand if brand in known else None)[0] for brand, title in zip(brands, titles)
+    ])
+    return df
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+
+
+class _Request:
+    def __init__(self, text, labels, threshold):
+        self.text = text
+        self.labels = tuple(labels)
+        self.threshold = threshold
+        self.future = Future()
+
+
+class InferenceScheduler:
+    """Group concurrent predict_entities calls into batched GLiNER forward passes"""
+
+    def __init__(self, model, max_batch_size=16, max_wait_ms=5, timeout=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.timeouts = 0
+        self.batch_sizes = Counter()
+        # Moving average of one forward pass, used to predict how long a new request would wait
+        self.batch_seconds = None
+        # One scheduler serves the process for its whole life; the daemon worker ends with it
+        self._worker = threading.Thread(target=self._run, name='ner-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, text, labels, threshold=0.5):
+        """Queue one text and return a Future resolving to its entities"""
+        request = _Request(text, labels, threshold)
+        self._queue.put(request)
+        return request.future
+
+    def predict_entities(self, text, labels, threshold=0.5, timeout=None):
+        """Drop-in for GLiNER.predict_entities that waits for the batched result"""
+        future = self.submit(text, labels, threshold)
+        try:
+            return future.result(timeout if timeout is not None else self.timeout)
+        except TimeoutError:
+            # Drop it from the next batch if the worker has not picked it up yet
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def batch_predict_entities(self, texts, labels, threshold=0.5):
+        """Queue several texts at once; the worker batches them with other sessions' requests"""
+        futures = [self.submit(text, labels, threshold) for text in texts]
+        return [future.result() for future in futures]
+
+    def _collect(self):
+        """Block for one request, then gather whatever arrives within the batching window"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Requests whose callers already gave up are skipped
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            groups = defaultdict(list)
+            for request in batch:
+                groups[(request.labels, request.threshold)].append(request)
+
+            for (labels, threshold), group in groups.items():
+                start = time.perf_counter()
+                try:
+                    outputs = self.model.batch_predict_entities(
+                        [request.text for request in group], list(labels), threshold=threshold
+                    )
+                except Exception as exc:
+                    for request in group:
+                        request.future.set_exception(exc)
+                    continue
+                for request, entities in zip(group, outputs):
+                    request.future.set_result(entities)
+
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.requests += len(group)
+                    self.batches += 1
+                    self.batch_sizes[len(group)] += 1
+                    self.batch_seconds = elapsed if self.batch_seconds is None else 0.8 * self.batch_seconds + 0.2 * elapsed
+
+    def expected_wait(self):
+        """Rough seconds until a request queued now is answered, from the queue depth and recent batch times"""
+        with self._lock:
+            batch_seconds = self.batch_seconds
+        if batch_seconds is None:
+            return 0.0
+        return (self._queue.qsize() // self.max_batch_size + 1) * batch_seconds
+
+    def stats(self):
+        """Queue depth, batch-size and timeout counters"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'requests': self.requests,
+                'batches': self.batches,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'max_batch_size': max(self.batch_sizes, default=0),
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'timeouts': self.timeouts,
+                'batch_ms': self.batch_seconds * 1000 if self.batch_seconds is not None else None,
+            }
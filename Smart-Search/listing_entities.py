@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from attributes import RAM_SIZES, STORAGE_SIZES, parse_capacity
+from catalog_store import read_catalog
+from gazetteer import GAZETTEER, MODEL_KEY_FORMAT, model_key
+from normalization import normalize_text
+from semantic_index import catalog_fingerprint, listing_texts
+
+ENTITIES_PATH = 'data/olx_products_entities.parquet'
+CHECKPOINT_DIR = 'data/entity_checkpoints'
+# Typed columns written per listing; category columns hold canonical gazetteer values where known
+ENTITY_COLUMNS = {
+    'ner_brand': 'category',
+    'ner_model': 'category',
+    'ner_storage_gb': 'Int16',
+    'ner_ram_gb': 'Int16',
+    'ner_battery_pct': 'Int16',
+    'ner_color': 'category',
+    'ner_condition': 'category',
+}
+
+# Set in each worker process by _init_worker
+_model = None
+
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def _canonical(text, label):
+    if not text:
+        return None
+    return GAZETTEER.first(text, label) or normalize_text(text)
+
+
+def entity_record(parsed):
+    """Typed column values for one listing from its parsed entities"""
+    storage_gb = parse_capacity(parsed['storage']) if parsed['storage'] else None
+    ram_gb = parse_capacity(parsed['ram']) if parsed['ram'] else None
+    key = model_key(parsed['model'], parsed['brand'])[0] if parsed['model'] else None
+    return {
+        'ner_brand': parsed['brand'],
+        'ner_model': key or (normalize_text(parsed['model']) if parsed['model'] else None),
+        'ner_storage_gb': storage_gb if storage_gb in STORAGE_SIZES else None,
+        'ner_ram_gb': ram_gb if ram_gb in RAM_SIZES else None,
+        'ner_battery_pct': parsed['battery_min'],
+        'ner_color': _canonical(parsed['color'], 'COLOR'),
+        'ner_condition': _canonical(parsed['condition'], 'CONDITION'),
+    }
+
+
+def _typed(frame):
+    for column, dtype in ENTITY_COLUMNS.items():
+        values = frame[column]
+        if dtype != 'category':
+            # Battery health can be written as "87.5%"; columns hold whole numbers like attributes.py
+            values = pd.to_numeric(values).round()
+        frame[column] = values.astype(dtype)
+    return frame
+
+
+def _init_worker(backend, threads):
+    global _model
+    from utils import NER_MODEL_NAME
+    from ner_backend import load_backend
+
+    _model = load_backend(NER_MODEL_NAME, backend, threads=threads)
+
+
+def _extract_chunk(start, texts, batch_size):
+    """Run batched GLiNER over one chunk of listings in a worker; returns (start, frame)"""
+    from utils import NER_LABELS, NER_THRESHOLD, parse_entities
+
+    records = []
+    for offset in range(0, len(texts), batch_size):
+        batch = texts[offset:offset + batch_size]
+        batch_entities = _model.batch_predict_entities(batch, NER_LABELS, threshold=NER_THRESHOLD)
+        records.extend(entity_record(parse_entities(text, entities)) for text, entities in zip(batch, batch_entities))
+    return start, pd.DataFrame(records, columns=list(ENTITY_COLUMNS))
+
+
+def run_key(df, backend):
+    """Checkpoints are only reused for the same catalog, model, backend, labels and parser"""
+    from utils import NER_LABELS, NER_MODEL_NAME, NER_THRESHOLD, PARSE_VERSION
+
+    parts = [catalog_fingerprint(df), NER_MODEL_NAME, backend, NER_LABELS, NER_THRESHOLD, PARSE_VERSION, MODEL_KEY_FORMAT]
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _chunk_path(directory, start):
+    return os.path.join(directory, f"{start:08d}.parquet")
+
+
+def extract_listing_entities(df, output_path=ENTITIES_PATH, backend='torch', workers=2, chunk_size=1000,
+                             batch_size=16, checkpoint_dir=CHECKPOINT_DIR):
+    """Tag every listing with GLiNER in a process pool, checkpointing each chunk so an interrupted run resumes"""
+    from utils import NER_LABELS, NER_MODEL_NAME, NER_THRESHOLD
+
+    directory = os.path.join(checkpoint_dir, run_key(df, backend))
+    os.makedirs(directory, exist_ok=True)
+    texts = listing_texts(df)
+    starts = range(0, len(texts), chunk_size)
+    pending = [start for start in starts if not os.path.exists(_chunk_path(directory, start))]
+    print(f"{len(starts) - len(pending)} of {len(starts)} chunks already done in {directory}")
+
+    if pending:
+        # Each worker loads its own model, so the cores are split between them instead of oversubscribed
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        began = time.perf_counter()
+        # spawn, not fork: the torch thread pool does not survive forking
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(backend, threads),
+        ) as pool:
+            futures = [
+                pool.submit(_extract_chunk, start, texts[start:start + chunk_size], batch_size) for start in pending
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                start, frame = future.result()
+                # Written under a temporary name so a killed run never leaves a half-written chunk
+                path = _chunk_path(directory, start)
+                frame.to_parquet(path + '.tmp', index=False)
+                os.replace(path + '.tmp', path)
+                rate = done * chunk_size / (time.perf_counter() - began)
+                print(f"chunk {start:>8}: {done}/{len(pending)} ({rate:.0f} listings/s)")
+
+    entities = _typed(pd.concat(
+        [pd.read_parquet(_chunk_path(directory, start)) for start in starts], ignore_index=True
+    ))
+    entities.to_parquet(output_path, index=False)
+    metadata = {
+        'model': NER_MODEL_NAME,
+        'backend': backend,
+        'labels': NER_LABELS,
+        'threshold': NER_THRESHOLD,
+        'rows': len(entities),
+        'fingerprint': catalog_fingerprint(df),
+        'model_keys': MODEL_KEY_FORMAT,
+    }
+    with open(_metadata_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    shutil.rmtree(directory)
+    return metadata
+
+
+def load_listing_entities(df, path=ENTITIES_PATH):
+    """Entity columns aligned with the catalog rows, or None if missing or built for another dataset"""
+    if not os.path.exists(path) or not os.path.exists(_metadata_path(path)):
+        return None
+    with open(_metadata_path(path), encoding='utf-8') as f:
+        metadata = json.load(f)
+    if metadata.get('rows') != len(df) or metadata.get('fingerprint') != catalog_fingerprint(df):
+        return None
+    if metadata.get('model_keys') != MODEL_KEY_FORMAT:
+        # Keys in another format would never equal the ones tagged at load time
+        return None
+    return _typed(pd.read_parquet(path, columns=list(ENTITY_COLUMNS)))
+
+
+def _fill_category(df, column, values, missing=()):
+    """Categorical column from values, keeping existing entries that are set and not in missing"""
+    filled = values.astype(object)
+    if column in df.columns:
+        known = df[column].notna() & ~df[column].isin(missing)
+        filled = df[column].astype(object).where(known | filled.isna(), filled)
+    df[column] = pd.Categorical(filled)
+
+
+def merge_listing_entities(df, entities):
+    """Fill the typed catalog columns from extracted entities, so filters on them are column comparisons"""
+    entities = entities.set_axis(df.index)
+    # Regex and gazetteer values parsed at load time win; the model fills what they missed
+    for column in ('storage_gb', 'ram_gb', 'battery_pct'):
+        df[column] = df[column].fillna(entities[f'ner_{column}'])
+    _fill_category(df, 'brand_key', entities['ner_brand'], missing=('Other brand',))
+    _fill_category(df, 'model_key', entities['ner_model'])
+    _fill_category(df, 'color_key', entities['ner_color'])
+    _fill_category(df, 'condition_key', entities['ner_condition'])
+    return df
+
+
+if __name__ == '__main__':
+    from utils import NER_BACKEND
+
+    parser = argparse.ArgumentParser(description="Extract GLiNER entities from every listing into typed columns")
+    parser.add_argument('--data', help="Catalog file (defaults to the newest of the Arrow, Parquet and CSV copies)")
+    parser.add_argument('--output', default=ENTITIES_PATH)
+    parser.add_argument('--backend', default=NER_BACKEND)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--checkpoints', default=CHECKPOINT_DIR)
+    args = parser.parse_args()
+
+    catalog = read_catalog(args.data, ['title', 'description', 'product_url'])
+    info = extract_listing_entities(
+        catalog, args.output, args.backend, args.workers, args.chunk_size, args.batch_size, args.checkpoints
+    )
+    print(f"Saved entities for {info['rows']} listings to {args.output}")
@@ -1,8 +1,28 @@
+import time
+
 import streamlit as st
 import pandas as pd
 import altair as alt
 
-from utils import load_ner_model, parse_query_with_ner, search_products, load_data
+from utils import (
+    NER_BUDGET_S,
+    combine_results,
+    export_frame,
+    load_catalog_analytics,
+    load_data,
+    load_embedding_index,
+    load_embedding_model,
+    load_live_catalog,
+    load_model_loader,
+    load_parse_cache,
+    load_result_cache,
+    load_search_engine,
+    parse_query_with_ner,
+    parse_tier_stats,
+    search_many,
+    search_products,
+    semantic_search,
+)
 
 st.set_page_config(
     page_title="Smart Search | Industrial Insight Console",
@@ -234,33 +254,50 @@ div[data-testid="stSidebar"] {
 st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
+@st.cache_resource
+def startup_timings():
+    """Process-wide startup clock, shared by every session."""
+    return {"started": time.perf_counter()}
+
+
 @st.cache_resource
 def initialize_app():
-    """Load heavyweight assets once per session."""
-    return load_ner_model()
+    """Start loading heavyweight assets once per process."""
+    # GLiNER loads and warms up on a background thread while the catalog and indexes load here
+    return load_model_loader()
 
 
-model = initialize_app()
+startup = startup_timings()
+ner_loader = initialize_app()
 df = load_data()
 
 if df.empty:
     st.stop()
 
-price_series = df["price"].dropna()
-catalog_size = len(df)
-median_price = int(price_series.median()) if not price_series.empty else 0
-avg_price = int(price_series.mean()) if not price_series.empty else 0
-unique_brands = df["brand"].dropna().nunique()
-unique_locations = df["location"].dropna().nunique() if "location" in df.columns else 0
-battery_signal = (
-    df["description"]
-    .fillna("")
-    .str.contains(r"\d+%", case=False)
-    .mean()
-    if "description" in df.columns
-    else 0
-)
-battery_coverage = round(battery_signal * 100, 1)
+live_catalog = load_live_catalog()
+# A newer snapshot on disk is merged in the background; this run keeps the version it started with
+live_catalog.refresh_if_changed()
+catalog = live_catalog.current
+df = catalog.listings
+search_index = catalog.index
+# Embeddings cover the rows loaded at startup, which a full rebuild replaces
+embedding_index = load_embedding_index() if catalog.generation == 0 else None
+result_cache = load_result_cache()
+# None unless SEARCH_ENGINE selects an on-disk engine; the dashboard always reads the in-memory catalog
+search_engine = load_search_engine()
+parse_cache = load_parse_cache()
+# Sessions submit to a shared scheduler that batches GLiNER calls arriving together; None until it is ready
+model = ner_loader.get()
+
+# Aggregations run in DuckDB once per dataset version, not over the frame on every rerun
+analytics = load_catalog_analytics(search_index.version, df)
+summary = analytics.summary()
+catalog_size = summary["listings"]
+median_price = int(summary["median_price"] or 0)
+avg_price = int(summary["avg_price"] or 0)
+unique_brands = summary["brands"]
+unique_locations = summary["locations"]
+battery_coverage = round((summary["battery_coverage"] or 0) * 100, 1)
 
 if "search_query" not in st.session_state:
     st.session_state.search_query = "Industrial iPhone 13 Pro 256GB under 60000 with 80% battery"
@@ -419,6 +456,17 @@ with tabs[0]:
             placeholder="Example: Rugged iPhone 13 Pro 256GB below 60000 EGP with 80% battery",
             help="Use industrial scenarios, constraints, or performance KPIs in Arabic or English.",
         )
+        fuzzy_mode = st.toggle(
+            "Tolerate misspellings",
+            value=False,
+            help="Match brand and model names by trigram similarity, e.g. 'redme not 10' or 'Samsng'.",
+        )
+        # Semantic retrieval needs embeddings built offline with `python semantic_index.py`
+        semantic_mode = embedding_index is not None and st.toggle(
+            "Semantic retrieval (hybrid)",
+            value=False,
+            help="Rank by meaning for vague briefs, keeping any structured constraints parsed from the query.",
+        )
     with helper_col:
         st.markdown(
             """
@@ -430,17 +478,41 @@ with tabs[0]:
             """
 )
 
+    if model is None and ner_loader.state != "failed":
+        st.info("The NER model is still loading; queries are parsed by the rule-based parser until it is ready.")
+    elif model is None:
+        st.warning("The NER model failed to load; queries are parsed by the rule-based parser only.")
+
     if query:
         with st.spinner("Interpreting requirements and probing catalog..."):
-            parsed = parse_query_with_ner(query, model)
-            results, applied_filters = search_products(df, parsed)
+            parsed = parse_query_with_ner(query, model, cache=parse_cache, budget=NER_BUDGET_S)
+            if semantic_mode:
+                results, applied_filters = semantic_search(
+                    catalog.frame, parsed, search_index, embedding_index, load_embedding_model(), fuzzy=fuzzy_mode
+                )
+            else:
+                results, applied_filters = search_products(
+                    catalog.frame, parsed, search_index, fuzzy=fuzzy_mode, cache=result_cache, engine=search_engine
+                )
 
         st.session_state.search_query = query
+        if "first_result_s" not in startup:
+            startup["first_result_s"] = time.perf_counter() - startup["started"]
+            startup["first_result_tier"] = parsed["tier"]
+            print(f"Time to first result: {startup['first_result_s']:.1f} s ({parsed['tier']})")
 
         analytic_col, result_col = st.columns([1, 2])
 
         with analytic_col:
             st.markdown("#### Requirement decomposition")
+            tier_names = {
+                "rules": "rule-based parser",
+                "fallback": "rule-based parser (model loading)",
+                "cache": "parse cache",
+                "ner": "GLiNER",
+                "degraded": "rule-based parser (GLiNER over the latency budget)",
+            }
+            st.caption(f"Parsed by the {tier_names.get(parsed.get('tier'), 'GLiNER')}")
             if parsed["entities_found"]:
                 for entity in parsed["entities_found"]:
                     st.markdown(
@@ -483,7 +555,7 @@ with tabs[0]:
 
                 st.download_button(
                     "📥 Download filtered dataset (CSV)",
-                    data=results.to_csv(index=False).encode("utf-8"),
+                    data=export_frame(results).to_csv(index=False).encode("utf-8"),
                     file_name="smart_search_results.csv",
                     mime="text/csv",
                     use_container_width=True,
@@ -492,7 +564,7 @@ with tabs[0]:
                 toggle_table = st.toggle("Switch to tabular view", value=False, help="View all columns in a grid.")
 
                 if toggle_table:
-                    st.dataframe(results.reset_index(drop=True), use_container_width=True, height=420)
+                    st.dataframe(export_frame(results).reset_index(drop=True), use_container_width=True, height=420)
                 else:
                     for _, row in results.head(10).iterrows():
                         with st.container():
@@ -537,6 +609,37 @@ with tabs[0]:
                                 """
                                 st.markdown(card_html, unsafe_allow_html=True)
 
+    with st.expander("Bulk sourcing list", expanded=False):
+        st.caption("Paste one requirement per line; lines are parsed in GLiNER batches and searched in a single pass.")
+        bulk_text = st.text_area(
+            "Sourcing list",
+            height=180,
+            placeholder="iPhone 11 128GB under 20000\nSamsung A54 8GB RAM below 15000\nشاومي ريدمي نوت 12 اقل من 10000",
+        )
+        bulk_queries = [line.strip() for line in bulk_text.splitlines() if line.strip()]
+        if st.button("Search every line", type="primary", disabled=not bulk_queries):
+            with st.spinner(f"Sourcing {len(bulk_queries)} requirements..."):
+                bulk_outcomes = search_many(
+                    bulk_queries, model, catalog.frame, search_index, limit=50, parse_cache=parse_cache, engine=search_engine
+                )
+
+            bulk_summary = pd.DataFrame(
+                {
+                    "query": bulk_queries,
+                    "matches": [outcome.attrs["total_matches"] for outcome, _ in bulk_outcomes],
+                    "lowest price (EGP)": [outcome["price"].min() if not outcome.empty else None for outcome, _ in bulk_outcomes],
+                    "filters": [" · ".join(filters) for _, filters in bulk_outcomes],
+                }
+            )
+            st.dataframe(bulk_summary, use_container_width=True)
+            st.download_button(
+                "📥 Download combined shortlist (CSV, top 50 per line)",
+                data=combine_results(bulk_queries, bulk_outcomes).to_csv(index=False).encode("utf-8"),
+                file_name="smart_search_bulk_results.csv",
+                mime="text/csv",
+                use_container_width=True,
+            )
+
 with tabs[1]:
     st.subheader("Ops Dashboard")
     st.markdown(
@@ -547,23 +650,20 @@ with tabs[1]:
     )
 
     kpi_cols = st.columns(4)
-    kpi_cols[0].metric("95th percentile price", f"{price_series.quantile(0.95):,.0f} EGP" if not price_series.empty else "—")
+    kpi_cols[0].metric("95th percentile price", f"{summary['p95_price']:,.0f} EGP" if summary["p95_price"] is not None else "—")
     kpi_cols[1].metric(
         "Mean vs median spread",
         f"{avg_price - median_price:,.0f} EGP",
         help="Positive spread highlights premium-heavy catalog regions.",
     )
-    kpi_cols[2].metric("Top 5 brands share", f"{df['brand'].value_counts(normalize=True).head(5).sum()*100:,.1f}%")
-    kpi_cols[3].metric("Distinct storage options", df["storage"].dropna().nunique() if "storage" in df.columns else "—")
+    kpi_cols[2].metric("Top 5 brands share", f"{analytics.top_brands_share(5)*100:,.1f}%")
+    kpi_cols[3].metric("Distinct storage options", summary["storage_options"])
 
     chart_col1, chart_col2 = st.columns(2)
 
     with chart_col1:
         st.markdown("##### Brand penetration")
-        top_brands = (
-            df["brand"].fillna("Unclassified").value_counts().head(10).reset_index()
-        )
-        top_brands.columns = ["brand", "count"]
+        top_brands = analytics.brand_counts(10)
         brand_chart = (
             alt.Chart(top_brands)
             .mark_bar(cornerRadiusTopLeft=6, cornerRadiusTopRight=6)
@@ -581,15 +681,7 @@ with tabs[1]:
 
     with chart_col2:
         st.markdown("##### Price posture by brand")
-        price_insights = (
-            df.dropna(subset=["brand", "price"])
-            .groupby("brand")["price"]
-            .median()
-            .sort_values(ascending=False)
-            .head(8)
-            .reset_index()
-        )
-        price_insights.columns = ["brand", "median_price"]
+        price_insights = analytics.brand_median_prices(8)
         price_chart = (
             alt.Chart(price_insights)
             .mark_circle(size=200)
@@ -604,11 +696,11 @@ with tabs[1]:
         st.altair_chart(price_chart, use_container_width=True)
 
     st.markdown("##### Tactical drill-down")
-    focus_options = sorted(df["brand"].dropna().unique().tolist())[:40]
+    focus_options = analytics.brands(40)
     focus_brand = st.selectbox("Focus brand for quick audit", options=focus_options if focus_options else ["No data"])
 
     if focus_options:
-        detail_columns = [col for col in ["title", "price", "storage", "ram", "location"] if col in df.columns]
+        detail_columns = [col for col in ["title", "price", "storage_gb", "ram_gb", "battery_pct", "location"] if col in df.columns]
         if not detail_columns:
             st.info("Detailed attributes unavailable for this dataset.")
         else:
@@ -751,7 +843,7 @@ with st.sidebar:
 
     st.markdown("---")
     st.markdown("### Budget lens")
-    max_price = int(price_series.max()) if not price_series.empty else 100000
+    max_price = int(summary["max_price"]) if summary["max_price"] is not None else 100000
     budget_threshold = st.slider(
         "Budget threshold (EGP)",
         min_value=5000,
@@ -759,9 +851,66 @@ with st.sidebar:
         value=min(35000, max_price),
         step=1000,
     )
-    budget_items = (df["price"] <= budget_threshold).sum()
+    budget_items = analytics.listings_within(budget_threshold)
     st.metric("Listings within threshold", f"{budget_items:,}")
 
+    st.markdown("---")
+    st.markdown("### Search cache")
+    cache_stats = result_cache.stats()
+    cache_cols = st.columns(2)
+    cache_cols[0].metric("Hits", f"{cache_stats['hits']:,}")
+    cache_cols[1].metric("Misses", f"{cache_stats['misses']:,}")
+    st.caption(
+        f"Hit rate {cache_stats['hit_rate'] * 100:.0f}% · {cache_stats['size']} cached queries · "
+        f"{search_engine.name if search_engine else 'pandas'} engine · "
+        f"dataset version {search_engine.version if search_engine else search_index.version}"
+    )
+    refresh = live_catalog.last_refresh
+    if live_catalog.refreshing:
+        st.caption("Merging a new catalog snapshot...")
+    elif live_catalog.error is not None:
+        st.caption(f"Catalog refresh failed: {live_catalog.error}")
+    elif refresh is not None:
+        st.caption(
+            f"Last refresh ({refresh['mode']}): +{refresh['inserted']:,} new, {refresh['updated']:,} updated, "
+            f"-{refresh['deleted']:,} removed in {refresh['seconds']:.1f}s"
+        )
+
+    st.markdown("---")
+    st.markdown("### NER inference")
+    parse_stats = parse_cache.stats()
+    loader_stats = ner_loader.stats()
+    if model is None:
+        st.metric("Model status", loader_stats["state"].title())
+        st.caption(f"{loader_stats['elapsed_s']:.0f} s since startup · rule-based parsing in the meantime")
+        if loader_stats["error"]:
+            st.caption(f"Load error: {loader_stats['error']}")
+    else:
+        scheduler_stats = model.stats()
+        scheduler_cols = st.columns(2)
+        scheduler_cols[0].metric("Queue depth", scheduler_stats["queue_depth"])
+        scheduler_cols[1].metric("Avg batch size", f"{scheduler_stats['avg_batch_size']:.1f}")
+        st.caption(
+            f"{scheduler_stats['requests']:,} queries in {scheduler_stats['batches']:,} batches · "
+            f"largest batch {scheduler_stats['max_batch_size']} · {scheduler_stats['timeouts']} timeouts"
+        )
+        tier_stats = parse_tier_stats()
+        st.caption(
+            f"Degraded parses: {tier_stats['degraded']:,} of {tier_stats['total']:,} "
+            f"({tier_stats['degraded_rate'] * 100:.1f}%) over the {NER_BUDGET_S * 1000:.0f} ms budget"
+            if NER_BUDGET_S else "No latency budget on GLiNER parses"
+        )
+        st.caption(f"Loaded in {loader_stats['load_s']:.1f} s · warm-up {loader_stats['warm_up_s']:.2f} s")
+    if "first_result_s" in startup:
+        st.caption(
+            f"Time to first result: {startup['first_result_s']:.1f} s after startup "
+            f"(parsed by {startup['first_result_tier']})"
+        )
+    st.caption(
+        f"Parse cache: {parse_stats['size']:,} stored queries · "
+        f"hit rate {parse_stats['hit_rate'] * 100:.0f}% this session"
+    )
+
     st.markdown("---")
     st.markdown("### Tech Stack")
     st.markdown("[NAMAA-Space/gliner_arabic-v2.1](https://huggingface.co/NAMAA-Space/gliner_arabic-v2.1)")
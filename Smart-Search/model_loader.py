@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class BackgroundLoader:
+    """Load a model on a daemon thread and warm it up, so callers can carry on until it is ready"""
+
+    def __init__(self, load, warm_up=None, name='model-loader'):
+        self._load = load
+        self._warm_up = warm_up
+        self._ready = threading.Event()
+        self.value = None
+        self.error = None
+        self.state = 'loading'
+        self.started = time.perf_counter()
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            value = self._load()
+            self.load_seconds = time.perf_counter() - self.started
+            if self._warm_up is not None:
+                self.state = 'warming'
+                start = time.perf_counter()
+                self._warm_up(value)
+                self.warm_up_seconds = time.perf_counter() - start
+            self.value = value
+            self.state = 'ready'
+        except Exception as exc:
+            self.error = exc
+            self.state = 'failed'
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def get(self):
+        """The loaded model, or None while it is still loading"""
+        return self.value if self.ready else None
+
+    def result(self, timeout=None):
+        """Block until the model is ready and return it, re-raising a load failure"""
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"Model not ready after {timeout} s")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def stats(self):
+        """Loading state and how long loading and warm-up took"""
+        return {
+            'state': self.state,
+            'elapsed_s': time.perf_counter() - self.started,
+            'load_s': self.load_seconds,
+            'warm_up_s': self.warm_up_seconds,
+            'error': str(self.error) if self.error is not None else None,
+        }
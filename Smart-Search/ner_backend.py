@@ -0,0 +1,197 @@
+import argparse
+import os
+import statistics
+import time
+
+from gliner import GLiNER
+
+BACKENDS = ('torch', 'onnx')
+ONNX_MODEL_DIR = 'models/gliner_arabic_onnx'
+ONNX_MODEL_FILE = 'model.onnx'
+QUANTIZED_MODEL_FILE = 'model_quantized.onnx'
+
+# Bilingual queries used to check the ONNX export against the torch model
+PARITY_QUERIES = [
+    "iPhone 13 Pro 256GB under 70000",
+    "Samsung A54 less than 15k",
+    "iPhone 11 128GB white 80% battery",
+    "Xiaomi Redmi Note 12 8GB RAM blue",
+    "OnePlus 9 Pro used good condition",
+    "huawei nova 9 green like new",
+    "ايفون 14 برو بطاريه 80%",
+    "هواوي P50 اقل من 8 الف",
+    "شاومي ريدمي نوت12",
+    "سامسونج جالاكسي اس 23 الترا رام 12 لون اسود",
+    "اوبو رينو 8 جديد متبرشم",
+    "ايفون 12 ميني ابيض 128 جيجا مستعمل",
+]
+
+
+def load_torch_model(model_name):
+    """Load the full-precision PyTorch GLiNER model on CPU"""
+    return GLiNER.from_pretrained(model_name, map_location='cpu')
+
+
+def load_onnx_model(model_dir=ONNX_MODEL_DIR, model_file=QUANTIZED_MODEL_FILE, threads=None):
+    """Load an exported GLiNER model into an onnxruntime session with a fixed thread count"""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return GLiNER.from_pretrained(
+        model_dir, load_onnx_model=True, onnx_model_file=model_file, session_options=options
+    )
+
+
+def load_backend(model_name, backend='torch', model_dir=ONNX_MODEL_DIR, threads=None):
+    """Load GLiNER on the requested backend ('torch' or 'onnx')"""
+    if backend == 'torch':
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return load_torch_model(model_name)
+    if backend == 'onnx':
+        if not os.path.exists(os.path.join(model_dir, QUANTIZED_MODEL_FILE)):
+            raise FileNotFoundError(
+                f"No quantized ONNX model in {model_dir}; run 'python ner_backend.py export' first"
+            )
+        return load_onnx_model(model_dir, threads=threads)
+    raise ValueError(f"Unknown NER backend: {backend!r} (expected one of {', '.join(BACKENDS)})")
+
+
+def export_onnx(model_name, model_dir=ONNX_MODEL_DIR, opset=14):
+    """Export GLiNER to ONNX and write a dynamically int8-quantized copy next to it"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model = load_torch_model(model_name)
+    # Config and tokenizer are saved alongside so the directory loads on its own
+    model.save_pretrained(model_dir)
+
+    inputs, _ = model.prepare_model_inputs(["iPhone 13 Pro 256GB ابيض"], ["BRAND", "MODEL", "COLOR"])
+    names = ['input_ids', 'attention_mask', 'words_mask', 'text_lengths']
+    axes = {
+        'input_ids': {0: 'batch_size', 1: 'sequence_length'},
+        'attention_mask': {0: 'batch_size', 1: 'sequence_length'},
+        'words_mask': {0: 'batch_size', 1: 'sequence_length'},
+        'text_lengths': {0: 'batch_size', 1: 'value'},
+        'logits': {0: 'position', 1: 'batch_size', 2: 'sequence_length', 3: 'num_classes'},
+    }
+    if model.config.span_mode != 'token_level':
+        names += ['span_idx', 'span_mask']
+        axes['span_idx'] = {0: 'batch_size', 1: 'num_spans', 2: 'idx'}
+        axes['span_mask'] = {0: 'batch_size', 1: 'num_spans'}
+
+    onnx_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+    quantized_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+    torch.onnx.export(
+        model.model,
+        tuple(inputs[name] for name in names),
+        f=onnx_path,
+        input_names=names,
+        output_names=['logits'],
+        dynamic_axes=axes,
+        opset_version=opset,
+    )
+    # Weights become int8, activations are quantized on the fly at run time
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QUInt8)
+    return onnx_path, quantized_path
+
+
+def _rss_mb():
+    """Resident memory of this process in MB (Linux), or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _entity_set(entities):
+    return {(entity['label'], entity['text'].strip().lower()) for entity in entities}
+
+
+def profile_backend(load, queries, labels, threshold, repeats=3):
+    """Load a backend and time predict_entities over the queries; returns (model, report, outputs)"""
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    model = load()
+    load_seconds = time.perf_counter() - start
+    rss_after = _rss_mb()
+
+    # One untimed pass so lazy initialisation does not count against the first query
+    model.predict_entities(queries[0], labels, threshold=threshold)
+    timings = []
+    outputs = []
+    for query in queries:
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            entities = model.predict_entities(query, labels, threshold=threshold)
+            timings.append(time.perf_counter() - start)
+        outputs.append(entities)
+
+    timings.sort()
+    report = {
+        'load_s': load_seconds,
+        'rss_mb': rss_after - rss_before if rss_before is not None else None,
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+    return model, report, outputs
+
+
+def compare_backends(model_name, labels, threshold, queries=PARITY_QUERIES, model_dir=ONNX_MODEL_DIR, threads=None):
+    """Run both backends on the same queries; returns per-backend reports and entity mismatches"""
+    reports = {}
+    outputs = {}
+    for backend in BACKENDS:
+        model, reports[backend], outputs[backend] = profile_backend(
+            lambda: load_backend(model_name, backend, model_dir, threads), queries, labels, threshold
+        )
+        del model
+
+    mismatches = []
+    for query, torch_entities, onnx_entities in zip(queries, outputs['torch'], outputs['onnx']):
+        expected, found = _entity_set(torch_entities), _entity_set(onnx_entities)
+        if expected != found:
+            mismatches.append((query, sorted(expected - found), sorted(found - expected)))
+    return reports, mismatches
+
+
+if __name__ == '__main__':
+    from utils import NER_LABELS, NER_MODEL_NAME, NER_THRESHOLD
+
+    parser = argparse.ArgumentParser(description="GLiNER inference backends")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    export = subcommands.add_parser('export', help="Export GLiNER to ONNX with int8 dynamic quantization")
+    export.add_argument('--output', default=ONNX_MODEL_DIR)
+    export.add_argument('--opset', type=int, default=14)
+    compare = subcommands.add_parser('compare', help="Check ONNX entities against torch and report latency/memory")
+    compare.add_argument('--queries', help="Text file with one query per line (defaults to a built-in bilingual set)")
+    compare.add_argument('--model-dir', default=ONNX_MODEL_DIR)
+    compare.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        for path in export_onnx(NER_MODEL_NAME, args.output, args.opset):
+            print(f"Wrote {path} ({os.path.getsize(path) / 2 ** 20:.0f} MB)")
+    else:
+        query_set = PARITY_QUERIES
+        if args.queries:
+            with open(args.queries, encoding='utf-8') as f:
+                query_set = [line.strip() for line in f if line.strip()]
+        backend_reports, entity_mismatches = compare_backends(
+            NER_MODEL_NAME, NER_LABELS, NER_THRESHOLD, query_set, args.model_dir, args.threads
+        )
+
+        print(f"{'backend':<8} {'load s':>8} {'RSS MB':>8} {'median ms':>10} {'p95 ms':>8}")
+        for name, report in backend_reports.items():
+            rss = f"{report['rss_mb']:.0f}" if report['rss_mb'] is not None else 'n/a'
+            print(f"{name:<8} {report['load_s']:>8.1f} {rss:>8} {report['median_ms']:>10.1f} {report['p95_ms']:>8.1f}")
+        for query, missing, extra in entity_mismatches:
+            print(f"DIFF {query!r}\n  only torch: {missing}\n  only onnx:  {extra}")
+        print(f"{len(query_set) - len(entity_mismatches)}/{len(query_set)} queries with identical entities")
@@ -0,0 +1,58 @@
+import re
+
+# Arabic-Indic and Persian digits plus the Arabic percent sign
+DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٪', '01234567890123456789%')
+# Spelling variants that sellers and buyers use interchangeably
+LETTER_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+})
+# Harakat, superscript alef, tatweel, and invisible direction/zero-width marks
+STRIP_PATTERN = re.compile(r'[\u064b-\u0652\u0670\u0640\u200b-\u200f\u202a-\u202e\u2066-\u2069\ufeff]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# Letters and digits are split apart so "128GB" and "نوت12" become two tokens
+TOKEN_PATTERN = re.compile(r'\d+|[^\W\d_]+')
+
+# Catalog columns stored in normalized form at load time
+NORMALIZED_COLUMNS = {'title': 'title_norm', 'description': 'description_norm'}
+
+
+def normalize_arabic_numbers(text):
+    """Convert Arabic numerals to Western numerals"""
+    return text.translate(DIGITS)
+
+
+def normalize_text(text):
+    """Fold digits, case, Arabic letter variants, diacritics and spacing to one canonical form"""
+    if not isinstance(text, str):
+        return ''
+    text = STRIP_PATTERN.sub('', text.translate(DIGITS).lower())
+    return WHITESPACE_PATTERN.sub(' ', text.translate(LETTER_VARIANTS)).strip()
+
+
+def split_tokens(normalized):
+    """Split already normalized text into word and number tokens"""
+    return TOKEN_PATTERN.findall(normalized)
+
+
+def tokenize(text):
+    """Normalize raw text and split it into word and number tokens"""
+    return split_tokens(normalize_text(text))
+
+
+def normalized_values(df, field):
+    """Normalized strings of a catalog column, read from its stored column when present"""
+    stored = NORMALIZED_COLUMNS.get(field)
+    if stored in df.columns:
+        return df[stored].tolist()
+    return [normalize_text(text) for text in df[field].tolist()]
+
+
+def normalize_catalog(df):
+    """Add normalized title and description columns so matching never re-folds the catalog"""
+    for field, stored in NORMALIZED_COLUMNS.items():
+        if field in df.columns:
+            df[stored] = [normalize_text(text) for text in df[field].tolist()]
+    return df
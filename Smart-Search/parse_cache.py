@@ -0,0 +1,127 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from normalization import normalize_text
+
+PARSE_CACHE_PATH = 'data/parse_cache.sqlite3'
+
+
+class ParseCache:
+    """SQLite-backed memo of parsed queries that survives process restarts"""
+
+    def __init__(self, path=PARSE_CACHE_PATH, model_name='', labels=(), threshold=None, max_entries=50000):
+        # Parses from another model, label set or threshold live under a different namespace
+        signature = json.dumps([model_name, list(labels), threshold])
+        self.namespace = hashlib.sha1(signature.encode('utf-8')).hexdigest()[:16]
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS parses ('
+                ' namespace TEXT NOT NULL,'
+                ' query TEXT NOT NULL,'
+                ' parsed TEXT NOT NULL,'
+                ' last_used REAL NOT NULL,'
+                ' PRIMARY KEY (namespace, query))'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)')
+
+    def get(self, query):
+        """Return the stored parse for a query, or None"""
+        key = normalize_text(query)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT parsed FROM parses WHERE namespace = ? AND query = ?', (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE parses SET last_used = ? WHERE namespace = ? AND query = ?',
+                    (time.time(), self.namespace, key),
+                )
+        parsed = json.loads(row[0])
+        # The key is normalized, so hand back the caller's own phrasing as the raw query
+        parsed['raw_query'] = query
+        return parsed
+
+    def put(self, query, parsed):
+        """Store a parse, evicting the least recently used entries beyond max_entries"""
+        key = normalize_text(query)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO parses (namespace, query, parsed, last_used) VALUES (?, ?, ?, ?)',
+                (self.namespace, key, json.dumps(parsed, ensure_ascii=False, default=float), time.time()),
+            )
+            (count,) = self._conn.execute('SELECT COUNT(*) FROM parses').fetchone()
+            if count > self.max_entries:
+                # Trim to 90% so eviction does not run on every insert once full
+                self._conn.execute(
+                    'DELETE FROM parses WHERE rowid IN ('
+                    ' SELECT rowid FROM parses ORDER BY last_used LIMIT ?)',
+                    (count - int(self.max_entries * 0.9),),
+                )
+
+    def __contains__(self, query):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM parses WHERE namespace = ? AND query = ?', (self.namespace, normalize_text(query))
+            ).fetchone()
+        return row is not None
+
+    def stats(self):
+        """Hit/miss counters and stored entry count"""
+        with self._lock:
+            (size,) = self._conn.execute(
+                'SELECT COUNT(*) FROM parses WHERE namespace = ?', (self.namespace,)
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': size,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def read_query_log(path, top=None):
+    """Distinct queries from a one-query-per-line log, most frequent first"""
+    with open(path, encoding='utf-8') as f:
+        counts = Counter(line.strip() for line in f if line.strip())
+    return [query for query, _ in counts.most_common(top)]
+
+
+def warm_up(log_path, top=None, batch_size=32):
+    """Parse the most frequent logged queries that are not cached yet and store them"""
+    from utils import load_ner_model, load_parse_cache, parse_queries_with_ner
+
+    cache = load_parse_cache()
+    pending = [query for query in read_query_log(log_path, top) if query not in cache]
+    if pending:
+        parse_queries_with_ner(pending, load_ner_model(), batch_size, cache=cache)
+    return len(pending)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Persistent GLiNER parse cache")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    warm = subcommands.add_parser('warm', help="Preload parses for queries from a log file")
+    warm.add_argument('log', help="Text file with one query per line")
+    warm.add_argument('--top', type=int, default=None, help="Only the N most frequent queries")
+    warm.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.command == 'warm':
+        added = warm_up(args.log, args.top, args.batch_size)
+        print(f"Cached {added} new query parses")
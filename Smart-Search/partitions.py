@@ -0,0 +1,67 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Upper edges of the asking-price bands in EGP; the last band is open-ended
+PRICE_BAND_EDGES = (5000, 10000, 20000, 40000, 80000)
+# Band of listings without a price, which no price bound can match
+UNPRICED = -1
+EMPTY_ROWS = np.empty(0, dtype=np.int32)
+
+
+def price_bands(prices):
+    """Band number of each price, UNPRICED where it is missing"""
+    bands = np.searchsorted(PRICE_BAND_EDGES, prices, side='right')
+    return np.where(np.isnan(prices), UNPRICED, bands)
+
+
+class CatalogPartitions:
+    """Catalog rows grouped by brand key code and price band, with the price range of each partition
+
+    Partitions hold row positions into the one catalog frame, so rows keep their catalog order and every
+    other index still lines up with them.
+    """
+
+    def __init__(self, brand_codes, prices):
+        self.rows = {}
+        self.price_ranges = {}
+        self._add(brand_codes, prices, 0)
+
+    def _add(self, brand_codes, prices, start):
+        keys = pd.DataFrame({'brand': brand_codes, 'band': price_bands(prices)})
+        for (brand, band), positions in keys.groupby(['brand', 'band']).indices.items():
+            key = (int(brand), int(band))
+            rows = (positions + start).astype(np.int32)
+            values = prices[positions]
+            low, high = (np.nan, np.nan) if band == UNPRICED else (values.min(), values.max())
+            if key in self.rows:
+                # Appended rows come after every existing row, so the positions stay sorted
+                rows = np.concatenate([self.rows[key], rows])
+                low, high = min(self.price_ranges[key][0], low), max(self.price_ranges[key][1], high)
+            self.rows[key] = rows
+            self.price_ranges[key] = (low, high)
+
+    def extended(self, brand_codes, prices, start):
+        """Copy with rows start.. added to their partitions; deleted rows stay in place, masked by the index"""
+        extended = copy.copy(self)
+        extended.rows = dict(self.rows)
+        extended.price_ranges = dict(self.price_ranges)
+        extended._add(brand_codes, prices, start)
+        return extended
+
+    def prune(self, brand_code=None, low=None, high=None):
+        """Rows of the partitions that can hold matches, grouped by partition, or None when there is nothing to prune on"""
+        if brand_code is None and low is None and high is None:
+            return None
+        selected = []
+        for (brand, band), rows in self.rows.items():
+            if brand_code is not None and brand != brand_code:
+                continue
+            if low is not None or high is not None:
+                band_low, band_high = self.price_ranges[brand, band]
+                # Missing prices never satisfy a bound, and partition ranges are checked against it
+                if band == UNPRICED or (high is not None and band_low > high) or (low is not None and band_high < low):
+                    continue
+            selected.append(rows)
+        return np.concatenate(selected) if selected else EMPTY_ROWS
@@ -0,0 +1,104 @@
+import numpy as np
+
+# Rows of a presorted permutation checked per step while filling a page
+PAGE_SCAN_CHUNK = 4096
+
+# Relative cost classes used to order predicates before execution
+NUMERIC_COST = 0   # vectorized comparison on a typed column
+POSTINGS_COST = 1  # token index lookup and intersection
+SCORING_COST = 2   # relevance scoring over the whole catalog
+
+
+class Predicate:
+    """One filter of a parsed query, evaluated lazily into a boolean row mask"""
+
+    def __init__(self, label, evaluate, cost=NUMERIC_COST, selectivity=1.0, within=None):
+        self.label = label
+        self.evaluate = evaluate
+        # Optional: evaluate only some rows, given as positions, into a boolean array over them
+        self.within = within
+        self.cost = cost
+        # Estimated fraction of rows kept; lower runs earlier within a cost class
+        self.selectivity = selectivity
+
+
+def rows_to_mask(rows, size):
+    """Turn sorted row positions into a boolean mask"""
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def execute(predicates, size, memo=None):
+    """AND predicates into a single mask, cheapest and most selective first"""
+    # A memo shared between calls keeps masks by label, so a batch evaluates each predicate once
+    mask = np.ones(size, dtype=bool)
+    for predicate in sorted(predicates, key=lambda p: (p.cost, p.selectivity)):
+        if memo is None:
+            predicate_mask = predicate.evaluate()
+        elif predicate.label in memo:
+            predicate_mask = memo[predicate.label]
+        else:
+            predicate_mask = memo[predicate.label] = predicate.evaluate()
+        np.logical_and(mask, predicate_mask, out=mask)
+        # Nothing left to narrow down, skip the remaining predicates
+        if not mask.any():
+            break
+    return mask
+
+
+def execute_within(predicates, rows, memo=None):
+    """AND predicates over candidate rows only, each testing just the rows that are still left"""
+    for predicate in sorted(predicates, key=lambda p: (p.cost, p.selectivity)):
+        if not len(rows):
+            break
+        if memo is not None and predicate.label in memo:
+            keep = memo[predicate.label][rows]
+        elif predicate.within is not None:
+            keep = predicate.within(rows)
+        else:
+            # No row-subset form: evaluate the whole catalog once, as execute() would
+            mask = predicate.evaluate()
+            if memo is not None:
+                memo[predicate.label] = mask
+            keep = mask[rows]
+        rows = rows[keep]
+    return rows
+
+
+def order_rows(rows, ranks, limit=None, offset=0):
+    """Rows in the order of a presorted permutation, given each row's position in it, sliced to one page"""
+    rows = rows[np.argsort(ranks[rows], kind='stable')]
+    return rows[offset:] if limit is None else rows[offset:offset + limit]
+
+
+def top_rows(mask, permutation, limit=None, offset=0):
+    """Matching rows in permutation order, sliced to [offset, offset + limit)"""
+    if limit is None:
+        return permutation[mask[permutation]][offset:]
+
+    # Walk the permutation only until the requested page is filled
+    wanted = offset + limit
+    pages = []
+    found = 0
+    for start in range(0, len(permutation), PAGE_SCAN_CHUNK):
+        chunk = permutation[start:start + PAGE_SCAN_CHUNK]
+        chunk = chunk[mask[chunk]]
+        pages.append(chunk)
+        found += len(chunk)
+        if found >= wanted:
+            break
+    if not pages:
+        return permutation[:0]
+    return np.concatenate(pages)[offset:wanted]
+
+
+def rank_rows(mask, scores, limit=None, offset=0):
+    """Matching rows by descending score (catalog order on ties), sliced to one page"""
+    rows = np.flatnonzero(mask)
+    if limit is not None and offset + limit < len(rows):
+        # Select the top page with a partial partition instead of sorting every match
+        top = np.argpartition(-scores[rows], offset + limit - 1)[:offset + limit]
+        rows = np.sort(rows[top])
+    rows = rows[np.argsort(-scores[rows], kind='stable')]
+    return rows[offset:] if limit is None else rows[offset:offset + limit]
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+from attributes import RAM_SIZES, STORAGE_SIZES, parse_capacity
+from constraints import query_ranges
+from gazetteer import GAZETTEER, model_key
+from normalization import normalize_text, tokenize
+
+# Parsed-query fields that change which rows search_products returns (numeric bounds are keyed via ranges)
+FILTER_FIELDS = ('brand', 'model', 'storage', 'ram', 'color', 'battery_raw', 'condition')
+
+
+def canonical_query(parsed_query, order_by=None):
+    """Hashable form of a parsed query, shared by phrasings that resolve to the same filters"""
+    filters = []
+    ranges = query_ranges(parsed_query)
+    for field in FILTER_FIELDS:
+        value = parsed_query.get(field)
+        # A range on the same field replaces the entity filter, and battery text is unused next to one
+        if not value or field in ranges or (field == 'battery_raw' and 'battery' in ranges):
+            continue
+        if field in ('storage', 'ram'):
+            # "128GB", "128 جيجا" and "128" all filter on the same number
+            capacity = parse_capacity(value)
+            if capacity in (STORAGE_SIZES if field == 'storage' else RAM_SIZES):
+                value = capacity
+        if field in ('brand', 'color', 'condition'):
+            # Gazetteer synonyms ("ايفون", "apple") filter on the same canonical value
+            value = GAZETTEER.first(value, field.upper()) or value
+        elif field == 'model':
+            key, rest = model_key(value, parsed_query.get('brand'))
+            if key is not None:
+                value = ' '.join([key, *(GAZETTEER.first(token, 'SUFFIX') or token for token in rest)])
+        if isinstance(value, str):
+            value = normalize_text(value)
+        filters.append((field, value))
+    filters.extend(('range', field, low, high) for field, (low, high) in sorted(ranges.items()))
+
+    # The raw text only matters when it is ranked with BM25
+    terms = ()
+    if not filters or order_by == 'relevance':
+        terms = tuple(tokenize(parsed_query.get('raw_query', '')))
+    return tuple(filters), terms
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a TTL, scoped to one dataset version at a time"""
+
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, version):
+        # A new dataset version makes every stored result stale
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(self, version, key):
+        """Return the cached value or None, counting the hit or miss"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, version, key, value):
+        """Store a value, evicting the least recently used entries beyond maxsize"""
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,182 @@
+import argparse
+import json
+import re
+import statistics
+import time
+
+from attributes import RAM_KEYWORDS, RAM_SIZES, SIZE_UNITS, STORAGE_KEYWORDS, STORAGE_SIZES
+from constraints import extract_constraints
+from gazetteer import GAZETTEER
+from normalization import TOKEN_PATTERN, normalize_text
+
+
+def _words(*alternatives):
+    """Regex for whole words, where digits may follow directly ("نوت12")"""
+    return r'(?<![^\W\d_])(?:' + '|'.join(alternatives) + r')(?![^\W\d_])'
+
+
+def _surfaces(label):
+    """Gazetteer spellings of every value of a label, longest first so alternation prefers them"""
+    found = [surface for (entry, _), surfaces in GAZETTEER.synonyms.items() if entry == label for surface in surfaces]
+    return [re.escape(surface) for surface in sorted(found, key=len, reverse=True)]
+
+
+# Product lines that start a model name; iPhone is both a brand spelling and a line
+MODEL_FAMILIES = _words(*_surfaces('FAMILY'))
+MODEL_SUFFIXES = _words(*_surfaces('SUFFIX'), 'fe')
+MODEL_CODE = r'(?:[a-z]{1,2}\s?\d{1,3}[a-z]?(?![\d%])|\d{1,2}(?![\d%])|(?<![a-z])(?:xs|xr|se)(?![a-z]))'
+# "iphone 11 pro max", "redmi note 12", "ريدمي نوت12", "galaxy s23 ultra", or a bare code like "a54"
+MODEL_PATTERN = re.compile(
+    r'(?:' + MODEL_FAMILIES + r'\s*)+' + MODEL_CODE + r'(?:\s*' + MODEL_SUFFIXES + r')*'
+    r'|(?<![^\W\d_])[a-z]\d{2,3}[a-z]?(?![^\W_])(?:\s*' + MODEL_SUFFIXES + r')*'
+)
+
+RAM_PATTERN = re.compile(
+    r'(\d+)\s*(?:' + SIZE_UNITS + r')?\s*' + RAM_KEYWORDS + r'|' + RAM_KEYWORDS + r'\s*:?\s*(\d+)\s*(?:' + SIZE_UNITS + r')?'
+)
+STORAGE_PATTERN = re.compile(
+    r'(\d+)\s*(?:(tb|تيرا)|' + SIZE_UNITS + r')'
+    r'|' + STORAGE_KEYWORDS + r'\s*:?\s*(\d+)\s*(?:(tb|تيرا)|' + SIZE_UNITS + r')?'
+)
+PAIR_PATTERN = re.compile(r'(?<![\d/])(\d{1,4})\s*/\s*(\d{1,4})(?![\d/])')
+
+# Words that carry no filter and can be dropped without changing the parse
+FILLER_WORDS = {
+    'i', 'want', 'need', 'looking', 'for', 'a', 'an', 'the', 'with', 'and', 'in', 'of', 'please', 'show', 'me',
+    'find', 'buy', 'phone', 'mobile', 'smartphone', 'color', 'colour', 'egp', 'le', 'pound', 'pounds', 'gb',
+    'عايز', 'عاوز', 'محتاج', 'ابحث', 'عن', 'في', 'من', 'مع', 'و', 'ب', 'تليفون', 'موبايل', 'هاتف', 'جوال',
+    'فون', 'لون', 'جنيه', 'ج',
+}
+
+
+def _entity(text, start, end, label):
+    return {'start': start, 'end': end, 'text': text[start:end].strip(), 'label': label, 'score': 1.0}
+
+
+def _overlaps(span, taken):
+    return any(span[0] < end and start < span[1] for start, end in taken)
+
+
+def rule_entities(query):
+    """Deterministic entities for a query plus the tokens the rules could not account for
+
+    Entities use the GLiNER output format so parse_entities treats both tiers alike.
+    """
+    text = normalize_text(query)
+    entities = []
+    taken = []
+    values = {}
+
+    def claim(start, end, label, allow_overlap=False, value=None):
+        if not allow_overlap and _overlaps((start, end), taken):
+            return False
+        entity = _entity(text, start, end, label)
+        entities.append(entity)
+        taken.append((start, end))
+        # Gazetteer synonyms ("ايفون", "iphone") count as one value
+        values.setdefault(label, set()).add(value or entity['text'])
+        return True
+
+    # Spans are claimed most specific first so "128gb" never reads as a model number
+    for constraint in extract_constraints(query):
+        claim(constraint.start, constraint.end, constraint.field.upper())
+
+    for match in PAIR_PATTERN.finditer(text):
+        first, second = int(match.group(1)), int(match.group(2))
+        ram, storage = (match.span(1), match.span(2)) if first < second else (match.span(2), match.span(1))
+        if min(first, second) in RAM_SIZES and max(first, second) in STORAGE_SIZES and not _overlaps(match.span(), taken):
+            claim(*ram, 'RAM')
+            claim(*storage, 'STORAGE')
+            taken.append(match.span())
+
+    for match in RAM_PATTERN.finditer(text):
+        if int(match.group(1) or match.group(2)) in RAM_SIZES:
+            claim(*match.span(), 'RAM')
+
+    for match in STORAGE_PATTERN.finditer(text):
+        value = int(match.group(1) or match.group(3))
+        if (value * 1024 if match.group(2) or match.group(4) else value) in STORAGE_SIZES:
+            claim(*match.span(), 'STORAGE')
+
+    for match in MODEL_PATTERN.finditer(text):
+        claimed = [start for start, end in taken if match.start() < end and start < match.end()]
+        if claimed and min(claimed) > match.start():
+            # A suffix word that a constraint took ("iphone 13 max 20000") leaves the model before it
+            match = MODEL_PATTERN.match(text, match.start(), min(claimed)) or match
+        claim(*match.span(), 'MODEL')
+
+    # One automaton pass tags brands, colors and conditions; brand words may sit inside a model span
+    for start, end, label, canonical in GAZETTEER.tag(text, {'BRAND', 'COLOR', 'CONDITION'}):
+        claim(start, end, label, allow_overlap=label == 'BRAND', value=canonical)
+
+    # Two different values for one field means the rules cannot tell which one the user meant
+    ambiguous = any(len(found) > 1 for found in values.values())
+
+    unresolved = [
+        match.group(0) for match in TOKEN_PATTERN.finditer(text)
+        if match.group(0) not in FILLER_WORDS and not _overlaps(match.span(), taken)
+    ]
+    if ambiguous:
+        unresolved.append('<ambiguous>')
+    return sorted(entities, key=lambda entity: entity['start']), unresolved
+
+
+def compare_tiers(queries, model):
+    """Parse each query with the rules and with GLiNER and report where the filters differ"""
+    from result_cache import canonical_query
+    from utils import parse_entities, parse_queries_with_ner
+
+    resolved = []
+    rule_times = []
+    for query in queries:
+        query = query.replace(',', '')
+        start = time.perf_counter()
+        entities, unresolved = rule_entities(query)
+        rule_times.append(time.perf_counter() - start)
+        if entities and not unresolved:
+            resolved.append((query, parse_entities(query, entities)))
+
+    start = time.perf_counter()
+    ner_parses = parse_queries_with_ner([query for query, _ in resolved], model, rules=False)
+    ner_time = (time.perf_counter() - start) / max(len(resolved), 1)
+
+    disagreements = [
+        (query, canonical_query(rules), canonical_query(ner))
+        for (query, rules), ner in zip(resolved, ner_parses)
+        if canonical_query(rules) != canonical_query(ner)
+    ]
+    return {
+        'queries': len(queries),
+        'rule_resolved': len(resolved),
+        'disagreements': disagreements,
+        'median_rule_ms': statistics.median(rule_times) * 1000 if rule_times else 0.0,
+        'mean_ner_ms': ner_time * 1000,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the rule-based parser against GLiNER on a query set")
+    parser.add_argument('queries', help="Text file with one query per line, or a .jsonl file of hand-labelled queries such as tests/labelled_queries.jsonl")
+    args = parser.parse_args()
+
+    from result_cache import canonical_query
+    from utils import load_ner_model, parse_queries_with_ner
+
+    with open(args.queries, encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    # Labelled sets also record the filters each query should parse to, written by hand
+    cases = [json.loads(line) for line in lines] if args.queries.endswith('.jsonl') else []
+    query_set = [case['query'] for case in cases] if cases else lines
+    model = load_ner_model()
+    report = compare_tiers(query_set, model)
+
+    for case, parsed in zip(cases, parse_queries_with_ner(query_set, model, rules=False)):
+        filters = [list(item) for item in canonical_query(parsed)[0]]
+        if filters != case['filters']:
+            print(f"LABEL {case['query']!r}\n  label: {case['filters']}\n  ner:   {filters}")
+
+    print(f"Rules resolved {report['rule_resolved']} of {report['queries']} queries "
+          f"(median {report['median_rule_ms']:.3f} ms vs {report['mean_ner_ms']:.1f} ms per GLiNER parse)")
+    for query, rules, ner in report['disagreements']:
+        print(f"DIFF {query!r}\n  rules: {rules}\n  ner:   {ner}")
+    print(f"{len(report['disagreements'])} disagreements")
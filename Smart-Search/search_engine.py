@@ -0,0 +1,21 @@
+class SearchEngine:
+    """Backend that answers parsed queries over one catalog version; search_products dispatches to it
+
+    Implementations return the same result shape: one page of listings indexed by catalog row, with the
+    full match count in attrs['total_matches'], and the labels of the filters they applied.
+    """
+
+    name = None
+
+    @property
+    def version(self):
+        """Identifies the catalog version the engine serves; keys the shared result cache"""
+        raise NotImplementedError
+
+    def search(self, parsed_query, limit=None, offset=0, order_by=None, fuzzy=False, memo=None):
+        """One page of listings matching a parsed query, and the applied filter labels"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Engine-specific figures for the sidebar"""
+        return {'engine': self.name}
@@ -0,0 +1,379 @@
+import copy
+import hashlib
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from normalization import normalize_text, normalized_values, split_tokens, tokenize
+from partitions import CatalogPartitions
+
+# Gazetteer-tagged categorical columns, matched by category code instead of by text
+CATEGORY_COLUMNS = ('brand_key', 'model_key', 'color_key', 'condition_key')
+EMPTY_POSTING = np.empty(0, dtype=np.int32)
+
+
+def _append_postings(postings, added, offset):
+    """Posting lists with rows of a later segment appended; lists of untouched keys are shared, not copied"""
+    merged = dict(postings)
+    for key, rows in added.items():
+        merged[key] = np.concatenate([postings.get(key, EMPTY_POSTING), rows + offset]).astype(np.int32)
+    return merged
+
+
+class InvertedIndex:
+    """Map normalized tokens to sorted row positions for each text column"""
+
+    FIELDS = ('title', 'description', 'brand')
+
+    def __init__(self, df, fields=FIELDS):
+        self.size = len(df)
+        self.postings = {}
+
+        for field in fields:
+            if field not in df.columns:
+                continue
+            buckets = defaultdict(list)
+            # Rows are visited in order, so every posting list comes out sorted
+            for row, text in enumerate(normalized_values(df, field)):
+                for token in set(split_tokens(text)):
+                    buckets[token].append(row)
+            self.postings[field] = {
+                token: np.array(rows, dtype=np.int32) for token, rows in buckets.items()
+            }
+
+    def lookup(self, field, token):
+        """Return the posting list of a single token in a field"""
+        return self.postings.get(field, {}).get(token, EMPTY_POSTING)
+
+    def estimate(self, text, fields):
+        """Upper bound on the number of rows match() can return, from posting lengths only"""
+        tokens = set(tokenize(text))
+        if not tokens:
+            return self.size
+        return sum(min(len(self.lookup(field, token)) for token in tokens) for field in fields)
+
+    def match(self, text, fields):
+        """Return sorted row positions where any field contains every token of text"""
+        tokens = set(tokenize(text))
+        if not tokens:
+            return np.arange(self.size, dtype=np.int32)
+
+        matches = EMPTY_POSTING
+        for field in fields:
+            # Intersect shortest lists first so the running result stays small
+            postings = sorted((self.lookup(field, token) for token in tokens), key=len)
+            rows = postings[0]
+            for posting in postings[1:]:
+                if not len(rows):
+                    break
+                rows = np.intersect1d(rows, posting, assume_unique=True)
+            matches = np.union1d(matches, rows)
+        return matches
+
+    def extended(self, df, start):
+        """Copy with rows start.. of df appended; positions stay sorted because appended rows come last"""
+        added = InvertedIndex(df.iloc[start:], tuple(self.postings))
+        extended = copy.copy(self)
+        extended.size = len(df)
+        extended.postings = {
+            field: _append_postings(self.postings[field], added.postings.get(field, {}), start)
+            for field in self.postings
+        }
+        return extended
+
+
+class BM25Ranker:
+    """Okapi BM25 over titles and descriptions, precomputed as a sparse doc x term weight matrix"""
+
+    def __init__(self, df, k1=1.2, b=0.75, title_weight=2):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self.size = len(df)
+        self.vocabulary = {}
+
+        tf = self._term_counts(df)
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        self.avg_len = doc_len.mean() if self.size else 0.0
+        doc_freq = np.bincount(tf.indices, minlength=tf.shape[1])
+        self.idf = np.log1p((self.size - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        # (first row, column-major weights) per segment; a refresh appends a segment instead of rebuilding
+        self.segments = [(0, self._weights(tf))]
+
+    def _term_counts(self, df):
+        """Sparse row x term counts, adding unseen terms to the vocabulary"""
+        rows, cols, counts = [], [], []
+        titles = normalized_values(df, 'title')
+        descriptions = normalized_values(df, 'description') if 'description' in df.columns else [''] * len(df)
+        for row, (title, description) in enumerate(zip(titles, descriptions)):
+            # Title terms count title_weight times so a hit in the title outranks one in the body
+            terms = Counter(split_tokens(title) * self.title_weight + split_tokens(description))
+            for term, count in terms.items():
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                counts.append(count)
+        return sparse.csr_matrix(
+            (np.array(counts, dtype=np.float32), (rows, cols)),
+            shape=(len(df), len(self.vocabulary)),
+        )
+
+    def _weights(self, tf):
+        # Bake tf saturation, length normalization and idf into every stored weight
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        norm = self.k1 * (1 - self.b + self.b * doc_len / max(self.avg_len, 1e-9))
+        tf_row_norm = np.repeat(norm, np.diff(tf.indptr)).astype(np.float32)
+        weights = tf.copy()
+        weights.data = tf.data * (self.k1 + 1) / (tf.data + tf_row_norm) * self.idf[tf.indices]
+        # Column-major so a query only touches the columns of its own terms
+        return weights.tocsc()
+
+    def score(self, text):
+        """Score every row against the query terms with one sparse matrix-vector product per segment"""
+        terms = Counter(term for term in tokenize(text) if term in self.vocabulary)
+        scores = np.zeros(self.size, dtype=np.float32)
+        for start, weights in self.segments:
+            # Terms first seen in a later segment have no column in earlier ones
+            present = {
+                self.vocabulary[term]: count for term, count in terms.items() if self.vocabulary[term] < weights.shape[1]
+            }
+            if present:
+                query = np.fromiter(present.values(), dtype=np.float32, count=len(present))
+                scores[start:start + weights.shape[0]] = weights[:, list(present)] @ query
+        return scores
+
+    def extended(self, df, start):
+        """Copy with rows start.. of df as a new segment, weighted with the existing length and idf statistics"""
+        extended = copy.copy(self)
+        extended.vocabulary = dict(self.vocabulary)
+        extended.size = len(df)
+        tf = extended._term_counts(df.iloc[start:])
+        # Only terms the catalog has never seen get a fresh idf; the rest keep theirs until the next rebuild
+        doc_freq = np.bincount(tf.indices, minlength=tf.shape[1])[len(self.idf):]
+        fresh = np.log1p((extended.size - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        extended.idf = np.concatenate([self.idf, fresh])
+        extended.segments = self.segments + [(start, extended._weights(tf))]
+        return extended
+
+
+def trigrams(text):
+    """Padded character trigrams of every word token, pg_trgm style"""
+    return token_trigrams(tokenize(text))
+
+
+def token_trigrams(tokens):
+    """Padded character trigrams of already split word tokens"""
+    grams = set()
+    for token in tokens:
+        # Model numbers must match exactly, so they never contribute fuzzy trigrams
+        if token.isdigit():
+            continue
+        padded = f'  {token} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Map character trigrams to sorted row positions for misspelling-tolerant lookups"""
+
+    def __init__(self, texts):
+        # texts are expected in normalize_text form
+        self.size = len(texts)
+        buckets = defaultdict(list)
+        for row, text in enumerate(texts):
+            for gram in token_trigrams(split_tokens(text)):
+                buckets[gram].append(row)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in buckets.items()}
+
+    def similar(self, text, threshold=0.6):
+        """Return sorted rows that contain at least `threshold` of the query's trigrams"""
+        grams = trigrams(text)
+        postings = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not postings:
+            return EMPTY_POSTING
+        # Count shared trigrams per row in one pass over the concatenated postings
+        hits = np.bincount(np.concatenate(postings), minlength=self.size)
+        return np.flatnonzero(hits >= threshold * len(grams)).astype(np.int32)
+
+    def extended(self, texts, start):
+        """Copy with texts appended as rows start.."""
+        extended = copy.copy(self)
+        extended.size = start + len(texts)
+        extended.postings = _append_postings(self.postings, TrigramIndex(texts).postings, start)
+        return extended
+
+
+def catalog_version(df):
+    """Content hash of the catalog, so caches can tell one dataset snapshot from the next"""
+    hashed = pd.util.hash_pandas_object(df[['product_url', 'title', 'price']], index=False)
+    return hashlib.md5(hashed.to_numpy().tobytes()).hexdigest()[:12]
+
+
+def _ordering_keys(df):
+    price = df['price'].to_numpy(dtype='float64', na_value=np.nan)
+    return {'price_asc': price, 'price_desc': -price}
+
+
+def sort_permutations(df):
+    """Row positions of the catalog presorted for every supported result ordering"""
+    # Stable sorts keep ties in catalog order; missing prices land last in both directions
+    return {name: np.argsort(keys, kind='stable').astype(np.int32) for name, keys in _ordering_keys(df).items()}
+
+
+def merge_permutations(orderings, df, start):
+    """Insert rows start.. of df into presorted permutations without re-sorting the existing rows"""
+    merged = {}
+    for name, keys in _ordering_keys(df).items():
+        permutation = orderings[name]
+        added = (start + np.argsort(keys[start:], kind='stable')).astype(np.int32)
+        # After equal keys, so ties still come out in catalog order
+        positions = np.searchsorted(keys[permutation], keys[added], side='right')
+        merged[name] = np.insert(permutation, positions, added)
+    return merged
+
+
+class SearchIndex:
+    """Derived structures built once per catalog load and shared by every query"""
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.version = catalog_version(df)
+        self.tokens = InvertedIndex(df)
+        self.orderings = sort_permutations(df)
+        self.bm25 = BM25Ranker(df)
+
+        # Fuzzy lookups: titles directly, brands through their distinct names
+        self.title_trigrams = TrigramIndex(normalized_values(df, 'title'))
+        self.brand_codes, self.brand_names = pd.factorize(df['brand'])
+        self.brand_trigrams = TrigramIndex([normalize_text(name) for name in self.brand_names])
+
+        # Per categorical column: value -> code, row codes (-1 for missing) and rows per code
+        self.categories = {}
+        for column in CATEGORY_COLUMNS:
+            if column in df.columns:
+                values = df[column].astype('category')
+                codes = values.cat.codes.to_numpy()
+                lookup = {value: code for code, value in enumerate(values.cat.categories)}
+                self.categories[column] = (lookup, codes, np.bincount(codes[codes >= 0], minlength=len(lookup)))
+
+        # Rows grouped by brand key and price band, so a brand or price bound skips whole partitions
+        self.partitions = CatalogPartitions(self._brand_key_codes(), _ordering_keys(df)['price_asc'])
+        # Inverse sort permutations, built on first use to order a pruned match set without a full scan
+        self._ranks = {}
+
+        # Rows still in the catalog; None until a refresh leaves deleted or superseded rows behind
+        self.live = None
+        self.segments = 1
+
+    def extended(self, df, start, dead):
+        """New index over df, whose rows before start are this index's; appended rows are indexed, dead rows masked
+
+        Work is proportional to the appended rows: existing postings, weights and codes are reused.
+        """
+        added = df.iloc[start:]
+        extended = copy.copy(self)
+        extended.size = len(df)
+        extended.tokens = self.tokens.extended(df, start)
+        extended.orderings = merge_permutations(self.orderings, df, start)
+        extended.bm25 = self.bm25.extended(df, start)
+        extended.title_trigrams = self.title_trigrams.extended(normalized_values(added, 'title'), start)
+
+        names = list(self.brand_names)
+        positions = {name: code for code, name in enumerate(names)}
+        codes = [positions.setdefault(name, len(positions)) if isinstance(name, str) else -1 for name in added['brand'].tolist()]
+        if len(positions) > len(names):
+            names = list(positions)
+            extended.brand_trigrams = TrigramIndex([normalize_text(name) for name in names])
+        extended.brand_names = pd.Index(names)
+        extended.brand_codes = np.concatenate([self.brand_codes, np.array(codes, dtype=self.brand_codes.dtype)])
+
+        extended.live = np.ones(extended.size, dtype=bool)
+        if self.live is not None:
+            extended.live[:start] = self.live
+        extended.live[dead] = False
+
+        extended.categories = {}
+        for column, (lookup, codes, _) in self.categories.items():
+            lookup = dict(lookup)
+            values = added[column].tolist() if column in added.columns else [None] * len(added)
+            appended = [lookup.setdefault(value, len(lookup)) if isinstance(value, str) else -1 for value in values]
+            # int32 so new values cannot overflow the narrow codes pandas picked for the original categories
+            codes = np.concatenate([codes, np.array(appended, dtype=np.int32)])
+            counted = codes[extended.live & (codes >= 0)]
+            extended.categories[column] = (lookup, codes, np.bincount(counted, minlength=len(lookup)))
+
+        prices = _ordering_keys(added)['price_asc']
+        extended.partitions = self.partitions.extended(extended._brand_key_codes()[start:], prices, start)
+        extended._ranks = {}
+
+        digest = hashlib.md5(self.version.encode())
+        digest.update(catalog_version(added).encode())
+        digest.update(np.asarray(dead, dtype=np.int64).tobytes())
+        extended.version = digest.hexdigest()[:12]
+        extended.segments = self.segments + 1
+        return extended
+
+    def ordering(self, order_by):
+        """Return the presorted permutation for an ordering name"""
+        if order_by not in self.orderings:
+            raise ValueError(f"Unsupported order_by {order_by!r}, expected one of {sorted(self.orderings)}")
+        return self.orderings[order_by]
+
+    def ordering_ranks(self, order_by):
+        """Position of every row in the presorted permutation for an ordering name"""
+        if order_by not in self._ranks:
+            permutation = self.ordering(order_by)
+            ranks = np.empty(len(permutation), dtype=np.int32)
+            ranks[permutation] = np.arange(len(permutation), dtype=np.int32)
+            self._ranks[order_by] = ranks
+        return self._ranks[order_by]
+
+    def _brand_key_codes(self):
+        if 'brand_key' in self.categories:
+            return self.categories['brand_key'][1]
+        return np.full(self.size, -1, dtype=np.int32)
+
+    def has_column(self, column):
+        """True if the catalog carries this tagged categorical column"""
+        return column in self.categories
+
+    def has_category(self, column, value):
+        """True if some row carries this value in a tagged categorical column"""
+        return column in self.categories and value in self.categories[column][0]
+
+    def category_count(self, column, value):
+        """Number of rows with this categorical value"""
+        lookup, _, counts = self.categories[column]
+        return int(counts[lookup[value]])
+
+    def category_code(self, column, value):
+        """Integer code of a categorical value, or None if no row has ever carried it"""
+        return self.categories[column][0].get(value) if column in self.categories else None
+
+    def category_mask(self, column, value, rows=None):
+        """Boolean mask of rows (all, or only the given positions) with this categorical value, by comparing integer codes"""
+        lookup, codes, _ = self.categories[column]
+        if rows is not None:
+            codes = codes[rows]
+        if value not in lookup:
+            return np.zeros(len(codes), dtype=bool)
+        return codes == lookup[value]
+
+    def category_missing(self, column, rows=None):
+        """Boolean mask of rows (all, or only the given positions) without a value in a categorical column"""
+        codes = self.categories[column][1]
+        return (codes if rows is None else codes[rows]) < 0
+
+    def fuzzy_title_rows(self, text, threshold=0.6):
+        """Sorted rows whose title is a close trigram match for the words of text and has all its numbers"""
+        rows = self.title_trigrams.similar(text, threshold) if trigrams(text) else np.arange(self.size, dtype=np.int32)
+        numbers = ' '.join(token for token in tokenize(text) if token.isdigit())
+        if numbers:
+            rows = np.intersect1d(rows, self.tokens.match(numbers, ['title']), assume_unique=True)
+        return rows
+
+    def fuzzy_brand_rows(self, text, threshold=0.6):
+        """Sorted rows whose brand name is a close trigram match for text"""
+        names = self.brand_trigrams.similar(text, threshold)
+        return np.flatnonzero(np.isin(self.brand_codes, names)).astype(np.int32)
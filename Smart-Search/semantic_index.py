@@ -0,0 +1,119 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from catalog_store import read_catalog
+
+# Small multilingual model that runs on CPU and covers Arabic and English
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+EMBEDDINGS_PATH = 'data/olx_products_embeddings.npy'
+# Rows scored per step so a memory-mapped float16 matrix is never upcast in one piece
+SCORE_CHUNK = 65536
+MAX_DESCRIPTION_CHARS = 400
+
+
+def catalog_fingerprint(df):
+    """Hash of the listing URLs, used to check embeddings still line up with the catalog rows"""
+    digest = hashlib.md5()
+    for url in df['product_url'].astype(str).tolist():
+        digest.update(url.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def listing_texts(df):
+    """Text embedded for each listing: the title plus the start of the description"""
+    titles = df['title'].fillna('').astype(str)
+    descriptions = df['description'].fillna('').astype(str).str.slice(0, MAX_DESCRIPTION_CHARS)
+    return (titles + '. ' + descriptions).tolist()
+
+
+def load_encoder(model_name=EMBEDDING_MODEL):
+    """Load the sentence-embedding model on CPU"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device='cpu')
+
+
+def encode_query(encoder, text):
+    """Embed a query as a unit-length float32 vector"""
+    return encoder.encode([text], normalize_embeddings=True)[0].astype(np.float32)
+
+
+def build_embeddings(df, output_path=EMBEDDINGS_PATH, model_name=EMBEDDING_MODEL, batch_size=64):
+    """Embed every listing and save a float16 matrix plus a metadata file next to it"""
+    encoder = load_encoder(model_name)
+    vectors = encoder.encode(
+        listing_texts(df),
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        show_progress_bar=True,
+    )
+    np.save(output_path, vectors.astype(np.float16))
+
+    metadata = {
+        'model': model_name,
+        'rows': len(df),
+        'dim': int(vectors.shape[1]),
+        'fingerprint': catalog_fingerprint(df),
+    }
+    with open(_metadata_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+class EmbeddingIndex:
+    """Exact cosine nearest-neighbour search over a memory-mapped float16 embedding matrix"""
+
+    def __init__(self, path=EMBEDDINGS_PATH):
+        with open(_metadata_path(path), encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        # Pages are read lazily by the OS and shared between processes
+        self.vectors = np.load(path, mmap_mode='r')
+        self.size = self.vectors.shape[0]
+
+    def matches(self, df):
+        """True if the embeddings were built from this exact catalog"""
+        return self.size == len(df) and self.metadata.get('fingerprint') == catalog_fingerprint(df)
+
+    def scores(self, query_vector, rows=None):
+        """Cosine similarity of the query to every row, or only to the given rows"""
+        if rows is not None:
+            return self.vectors[rows].astype(np.float32) @ query_vector
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCORE_CHUNK):
+            block = self.vectors[start:start + SCORE_CHUNK].astype(np.float32)
+            scores[start:start + len(block)] = block @ query_vector
+        return scores
+
+    def search(self, query_vector, k=50, mask=None):
+        """Top-k row positions and similarities, optionally restricted to a boolean mask"""
+        if mask is None:
+            rows = np.arange(self.size)
+            scores = self.scores(query_vector)
+        else:
+            rows = np.flatnonzero(mask)
+            scores = self.scores(query_vector, rows)
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Embed every listing for semantic search")
+    parser.add_argument('--data', help="Catalog file (defaults to the newest of the Arrow, Parquet and CSV copies)")
+    parser.add_argument('--output', default=EMBEDDINGS_PATH)
+    parser.add_argument('--model', default=EMBEDDING_MODEL)
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    catalog = read_catalog(args.data, ['title', 'description', 'product_url'])
+    info = build_embeddings(catalog, args.output, args.model, args.batch_size)
+    print(f"Saved {info['rows']} x {info['dim']} embeddings to {args.output}")
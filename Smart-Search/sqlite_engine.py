@@ -0,0 +1,345 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from attributes import RAM_SIZES, STORAGE_SIZES, parse_capacity
+from catalog_store import CSV_PATH, read_csv_catalog
+from constraints import RANGE_COLUMNS, query_ranges, range_label
+from gazetteer import GAZETTEER, canonical_brand, model_key
+from normalization import normalize_text, normalized_values, split_tokens, tokenize
+from search_engine import SearchEngine
+from semantic_index import catalog_fingerprint
+
+SQLITE_PATH = 'data/olx_products.sqlite3'
+# Typed columns of the listings table; `row` is the catalog position and the FTS rowid
+COLUMNS = {
+    'title': 'TEXT',
+    'price': 'REAL',
+    'location': 'TEXT',
+    'product_url': 'TEXT',
+    'main_image': 'TEXT',
+    'brand': 'TEXT',
+    'description': 'TEXT',
+    'seller_name': 'TEXT',
+    'storage_gb': 'INTEGER',
+    'ram_gb': 'INTEGER',
+    'battery_pct': 'INTEGER',
+    'brand_key': 'TEXT',
+    'model_key': 'TEXT',
+    'color_key': 'TEXT',
+    'condition_key': 'TEXT',
+}
+# Full-text columns hold normalized tokens joined by spaces, so FTS5 splits text exactly like tokenize()
+FTS_FIELDS = ('title', 'description', 'brand')
+TEXT_FIELDS = ['title', 'description']
+# bm25() column weights: title hits count double as in BM25Ranker, brand does not score
+BM25_WEIGHTS = (2.0, 1.0, 0.0)
+CATEGORY_COLUMNS = ('brand_key', 'model_key')
+# Ties stay in catalog order and missing prices sort last, like the presorted permutations
+ORDER_CLAUSES = {
+    'price_asc': 'l.price IS NULL, l.price, l.row',
+    'price_desc': 'l.price IS NULL, l.price DESC, l.row',
+    'relevance': 'r.score IS NULL, r.score, l.row',
+}
+MATCH = 'l.row IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)'
+
+
+def _phrase(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def _all_tokens(text, fields):
+    """FTS5 query for rows where one of the fields holds every token of text, as InvertedIndex.match"""
+    tokens = sorted(set(tokenize(text)))
+    if not tokens:
+        return None
+    terms = ' AND '.join(_phrase(token) for token in tokens)
+    return ' OR '.join(f"{field} : ({terms})" for field in fields)
+
+
+def _any_spelling(surfaces, fields):
+    """FTS5 query for rows matching any one of several spellings, or None if one of them matches everything"""
+    queries = [_all_tokens(surface, fields) for surface in surfaces]
+    if None in queries:
+        return None
+    return ' OR '.join(f"({query})" for query in queries)
+
+
+def _any_token(text):
+    """FTS5 query for rows whose title or description holds any token of text, as BM25 scores > 0"""
+    tokens = sorted(set(tokenize(text)))
+    if not tokens:
+        return None
+    return '{title description} : (' + ' OR '.join(_phrase(token) for token in tokens) + ')'
+
+
+def _matching(query):
+    """WHERE clause and parameters for an FTS5 query; no clause when the text has no tokens"""
+    return (MATCH, [query]) if query else (None, [])
+
+
+def _synonym_clause(label_type, text):
+    """Gazetteer column comparison, or any spelling in the text for listings without the column set"""
+    canonical = GAZETTEER.first(text, label_type)
+    surfaces = GAZETTEER.synonyms[label_type, canonical] if canonical else [text]
+    column = f"l.{label_type.lower()}_key"
+    spelled, params = _matching(_any_spelling(surfaces, TEXT_FIELDS))
+    return f"({column} = ? OR ({column} IS NULL AND {spelled or '1'}))", [canonical or normalize_text(text)] + params
+
+
+def _model_clause(model, models, brand=None):
+    """Model key comparison plus title words the key does not cover, or title text for unknown models"""
+    key, rest = model_key(model, brand)
+    if key is None or key not in models:
+        return _matching(_all_tokens(model, ['title']))
+    # Listings without a model key match on the model's words in their title, as in _model_predicate
+    spelled, params = _matching(_all_tokens(model, ['title']))
+    clauses, params = [f"(l.model_key = ? OR (l.model_key IS NULL AND {spelled or '1'}))"], [key] + params
+    for token in rest:
+        # Suffixes match in either language, other leftover words as written
+        surfaces = GAZETTEER.synonyms.get(('SUFFIX', GAZETTEER.first(token, 'SUFFIX')), [token])
+        clause, values = _matching(_any_spelling(surfaces, ['title']))
+        if clause:
+            clauses.append(clause)
+            params.extend(values)
+    return ' AND '.join(clauses), params
+
+
+def compile_query(parsed_query, categories, order_by=None, limit=None, offset=0):
+    """One parameterized SELECT for a parsed query; returns (sql, params, applied filter labels)
+
+    Filters mirror build_predicates in utils.py and carry the same labels.
+    """
+    clauses, params, labels = [], [], []
+
+    def add(label, clause, values):
+        labels.append(label)
+        if clause:
+            clauses.append(clause)
+            params.extend(values)
+
+    ranges = query_ranges(parsed_query)
+
+    if parsed_query['brand']:
+        brand = parsed_query['brand']
+        key = canonical_brand(brand) or brand
+        if key in categories['brand_key']:
+            add(f"Brand: {brand}", 'l.brand_key = ?', [key])
+        else:
+            add(f"Brand: {brand}", *_matching(_all_tokens(brand, ['brand'])))
+
+    if parsed_query['model']:
+        add(f"Model: {parsed_query['model']}", *_model_clause(parsed_query['model'], categories['model_key'], parsed_query['brand']))
+
+    for field, sizes in (('storage', STORAGE_SIZES), ('ram', RAM_SIZES)):
+        if parsed_query[field] and field not in ranges:
+            label = f"{'RAM' if field == 'ram' else 'Storage'}: {parsed_query[field]}"
+            size = parse_capacity(parsed_query[field])
+            if size in sizes:
+                add(label, f"l.{RANGE_COLUMNS[field]} = ?", [size])
+            else:
+                add(label, *_matching(_all_tokens(parsed_query[field], TEXT_FIELDS)))
+
+    if parsed_query['color']:
+        add(f"Color: {parsed_query['color']}", *_synonym_clause('COLOR', parsed_query['color']))
+
+    for field, (low, high) in ranges.items():
+        bounds = [(f"l.{RANGE_COLUMNS[field]} >= ?", low), (f"l.{RANGE_COLUMNS[field]} <= ?", high)]
+        bounds = [(clause, value) for clause, value in bounds if value is not None]
+        add(range_label(field, low, high), ' AND '.join(clause for clause, _ in bounds), [value for _, value in bounds])
+
+    if 'battery' not in ranges and parsed_query.get('battery_raw'):
+        add(f"Battery: {parsed_query['battery_raw']}", *_matching(_all_tokens(parsed_query['battery_raw'], ['description'])))
+
+    if parsed_query['condition']:
+        add(f"Condition: {parsed_query['condition']}", *_synonym_clause('CONDITION', parsed_query['condition']))
+
+    # No structured filter recognized: any query term in the title or description, ranked by bm25()
+    ranked = _any_token(parsed_query['raw_query'])
+    if not labels and ranked:
+        add(f"Text relevance: '{parsed_query['raw_query']}'", MATCH, [ranked])
+        order_by = order_by or 'relevance'
+    order_by = order_by or 'price_desc'
+    if order_by not in ORDER_CLAUSES:
+        raise ValueError(f"Unsupported order_by {order_by!r}, expected one of {sorted(ORDER_CLAUSES)}")
+
+    join, join_params = '', []
+    if order_by == 'relevance' and ranked:
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        join = (f"LEFT JOIN (SELECT rowid, bm25(listings_fts, {weights}) AS score FROM listings_fts "
+                "WHERE listings_fts MATCH ?) r ON r.rowid = l.row")
+        join_params = [ranked]
+    order = ORDER_CLAUSES[order_by] if join or order_by != 'relevance' else 'l.row'
+
+    # The window count is taken before LIMIT, so one statement returns the page and the match count
+    sql = (f"SELECT l.*, COUNT(*) OVER () AS total_matches FROM listings l {join} "
+           f"WHERE {' AND '.join(clauses) or '1'} ORDER BY {order} LIMIT ? OFFSET ?")
+    return sql, join_params + params + [-1 if limit is None else limit, offset], labels
+
+
+def _sql_values(series):
+    """Column values as Python scalars with None for missing, as sqlite3 binds them"""
+    return [None if pd.isna(value) else value for value in series.astype(object).tolist()]
+
+
+def build_database(df, output_path=SQLITE_PATH):
+    """Write a prepared catalog as SQLite: typed columns, B-tree indexes and an FTS5 index on normalized text"""
+    partial = output_path + '.tmp'
+    if os.path.exists(partial):
+        os.remove(partial)
+    with closing(sqlite3.connect(partial)) as connection:
+        columns = ', '.join(f"{column} {sql_type}" for column, sql_type in COLUMNS.items())
+        connection.execute(f"CREATE TABLE listings (row INTEGER PRIMARY KEY, {columns})")
+        values = {
+            column: _sql_values(df[column]) if column in df.columns else [None] * len(df)
+            for column in COLUMNS
+        }
+        values['price'] = [None if value is None else float(value) for value in values['price']]
+        for column in ('storage_gb', 'ram_gb', 'battery_pct'):
+            values[column] = [None if value is None else int(value) for value in values[column]]
+        placeholders = ', '.join('?' * (len(COLUMNS) + 1))
+        connection.executemany(
+            f"INSERT INTO listings VALUES ({placeholders})", zip(range(len(df)), *values.values())
+        )
+        connection.execute("CREATE INDEX listings_brand_price ON listings (brand_key, price)")
+        connection.execute("CREATE INDEX listings_model ON listings (model_key)")
+        connection.execute("CREATE INDEX listings_price ON listings (price)")
+
+        # Contentless: the listings table already holds the text, the index only needs the tokens
+        connection.execute(
+            f"CREATE VIRTUAL TABLE listings_fts USING fts5({', '.join(FTS_FIELDS)}, content='', "
+            "tokenize='unicode61 remove_diacritics 0')"
+        )
+        texts = [[' '.join(split_tokens(text)) for text in normalized_values(df, field)] for field in FTS_FIELDS]
+        connection.executemany(
+            f"INSERT INTO listings_fts (rowid, {', '.join(FTS_FIELDS)}) VALUES (?, ?, ?, ?)", zip(range(len(df)), *texts)
+        )
+        connection.execute("INSERT INTO listings_fts (listings_fts) VALUES ('optimize')")
+
+        connection.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)")
+        metadata = {'fingerprint': catalog_fingerprint(df), 'rows': str(len(df)), 'built_at': str(time.time())}
+        connection.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+        connection.execute("ANALYZE")
+        connection.commit()
+    # Written under a temporary name so a running app never opens a half-built database
+    os.replace(partial, output_path)
+    return metadata
+
+
+class SQLiteEngine(SearchEngine):
+    """Catalog on disk in SQLite; each parsed query runs as one parameterized statement
+
+    The database is opened read-only, so any number of processes can serve from the same file.
+    Fuzzy matching has no trigram index here and falls back to exact matching.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; build it with `python sqlite_engine.py build`")
+        self.path = path
+        self._local = threading.local()
+        connection = self.connection()
+        self.metadata = dict(connection.execute("SELECT key, value FROM metadata"))
+        self.categories = {
+            column: {value for (value,) in connection.execute(f"SELECT DISTINCT {column} FROM listings WHERE {column} IS NOT NULL")}
+            for column in CATEGORY_COLUMNS
+        }
+        self.queries = 0
+        self.seconds = 0.0
+
+    @property
+    def version(self):
+        return f"sqlite-{self.metadata['fingerprint'][:12]}"
+
+    def connection(self):
+        """Read-only connection of the calling thread (sqlite3 connections are not shared across threads)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    def _select(self, sql, params):
+        began = time.perf_counter()
+        results = pd.read_sql_query(sql, self.connection(), params=params, index_col='row')
+        self.queries += 1
+        self.seconds += time.perf_counter() - began
+        return results
+
+    def search(self, parsed_query, limit=None, offset=0, order_by=None, fuzzy=False, memo=None):
+        sql, params, labels = compile_query(parsed_query, self.categories, order_by, limit, offset)
+        results = self._select(sql, params)
+        total = results.pop('total_matches')
+        if len(results):
+            total = int(total.iloc[0])
+        elif offset:
+            # Past the last page the window has no rows to count; ask for the first one instead
+            sql, params, _ = compile_query(parsed_query, self.categories, order_by, 1, 0)
+            first = self._select(sql, params)['total_matches']
+            total = int(first.iloc[0]) if len(first) else 0
+        else:
+            total = 0
+        results.index.name = None
+        results = results.astype({column: 'Int16' for column in ('storage_gb', 'ram_gb', 'battery_pct')})
+        results.attrs['total_matches'] = total
+        return results, labels
+
+    def stats(self):
+        return {
+            'engine': self.name,
+            'rows': int(self.metadata['rows']),
+            'queries': self.queries,
+            'avg_ms': self.seconds / self.queries * 1000 if self.queries else 0.0,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SQLite FTS5 search engine over the cleaned catalog")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    build = subcommands.add_parser('build', help="Build the SQLite database from the cleaned CSV")
+    build.add_argument('--csv', default=CSV_PATH)
+    build.add_argument('--output', default=SQLITE_PATH)
+    query = subcommands.add_parser('query', help="Run queries through the SQLite and pandas engines side by side")
+    query.add_argument('queries', nargs='+')
+    query.add_argument('--database', default=SQLITE_PATH)
+    query.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args()
+
+    from utils import load_data, load_search_index, parse_query_with_ner, prepare_catalog, search_products
+
+    if args.command == 'build':
+        from listing_entities import load_listing_entities
+
+        began = time.perf_counter()
+        catalog = read_csv_catalog(args.csv)
+        info = build_database(prepare_catalog(catalog, load_listing_entities(catalog)), args.output)
+        print(f"Wrote {info['rows']} listings to {args.output} "
+              f"({os.path.getsize(args.output) / 2 ** 20:.1f} MB) in {time.perf_counter() - began:.1f} s")
+    else:
+        engine = SQLiteEngine(args.database)
+        df = load_data()
+        index = load_search_index()
+        for text in args.queries:
+            # Rule-based parse, so both engines see the same filters without loading GLiNER
+            parsed = parse_query_with_ner(text, None)
+            # Untimed first run, so neither engine is measured cold
+            search_products(None, parsed, limit=args.limit, engine=engine)
+            search_products(df, parsed, index, limit=args.limit)
+            began = time.perf_counter()
+            results, labels = search_products(None, parsed, limit=args.limit, engine=engine)
+            sqlite_ms = (time.perf_counter() - began) * 1000
+            began = time.perf_counter()
+            expected, _ = search_products(df, parsed, index, limit=args.limit)
+            pandas_ms = (time.perf_counter() - began) * 1000
+            print(f"{text!r}: {labels}")
+            print(f"  sqlite {results.attrs['total_matches']:,} matches in {sqlite_ms:.1f} ms, "
+                  f"pandas {expected.attrs['total_matches']:,} in {pandas_ms:.1f} ms")
+            for row, title in results['title'].items():
+                print(f"  {row:>6}  {title}")
@@ -0,0 +1,66 @@
+import pytest
+
+from constraints import constraint_ranges, extract_constraints
+
+CASES = [
+    # English operators, multipliers and units
+    ('iphone 13 128gb under 20000', [('price', None, 20000)]),
+    ('budget 15000', [('price', None, 15000)]),
+    ('max 20000', [('price', None, 20000)]),
+    ('above 8gb ram', [('ram', 8, None)]),
+    ('more than 256gb', [('storage', 256, None)]),
+    ('battery 80%', [('battery', 80, None)]),
+    # Arabic
+    ('فوق 80', [('battery', 80, None)]),
+    ('تحت20000', [('price', None, 20000)]),
+    ('بطاريه 85', [('battery', 85, None)]),
+    ('اقل من 15 الف', [('price', None, 15000)]),
+    ('ميزانيه 12000 جنيه', [('price', None, 12000)]),
+    # Ranges
+    ('between 10k and 20k', [('price', 10000, 20000)]),
+    ('between 10000 and 20000', [('price', 10000, 20000)]),
+    ('10-20k', [('price', 10000, 20000)]),
+    ('from 10 to 15 الف', [('price', 10000, 15000)]),
+    ('من 10 ل 15 الف', [('price', 10000, 15000)]),
+    ('بين 10 و 20 الف', [('price', 10000, 20000)]),
+    ('from samsung', []),
+    # Postfix operators and keywords
+    ('20000 max', [('price', None, 20000)]),
+    ('20k or less', [('price', None, 20000)]),
+    ('90% or more', [('battery', 90, None)]),
+    ('80% battery', [('battery', 80, None)]),
+    ('8gb ram or more', [('ram', 8, None)]),
+    ('under 20000 battery 85%', [('price', None, 20000), ('battery', 85, None)]),
+    # Model numbers next to operators and keywords
+    ('iphone 13', []),
+    ('iphone 13 max', []),
+    ('iphone 13 max 20000', [('price', None, 20000)]),
+    ('iphone 13 128gb max 25000', [('price', None, 25000)]),
+    ('pro max 256', []),
+    ('iphone 11 pro max 256', []),
+    ('iphone 11 pro max 256gb', []),
+    ('iphone 12 pro max 512', []),
+    ('redmi note 12 pro max 128', []),
+    ('ايفون 13 برو ماكس 256', []),
+    ('iphone 14 pro max 128 under 30000', [('price', None, 30000)]),
+    ('13 battery 88', [('battery', 88, None)]),
+    ('iphone 13 battery 88', [('battery', 88, None)]),
+    ('256 battery 90', [('battery', 90, None)]),
+    ('between 10000 and 20000 battery 80', [('price', 10000, 20000), ('battery', 80, None)]),
+    ('between 10000 and 20000 battery', [('price', 10000, 20000)]),
+]
+
+
+@pytest.mark.parametrize('query, expected', CASES)
+def test_extract_constraints(query, expected):
+    assert [(c.field, c.low, c.high) for c in extract_constraints(query)] == expected
+
+
+def test_keyword_span_leaves_model_number():
+    # The rule parser claims constraint spans, so "13" must stay outside for the model
+    [constraint] = extract_constraints('iphone 13 battery 88')
+    assert 'iphone 13 battery 88'[constraint.start:constraint.end] == 'battery 88'
+
+
+def test_repeated_fields_intersect():
+    assert constraint_ranges(extract_constraints('over 10000 under 20000 below 18000')) == {'price': [10000, 18000]}
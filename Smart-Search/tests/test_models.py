@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from gazetteer import model_key
+from search_index import SearchIndex
+from utils import parse_with_rules, prepare_catalog, search_products
+
+LISTINGS = [
+    ('Redmi Note 10 Pro 128gb', 'Xiaomi'),
+    ('شاومي ريدمي نوت 10', 'Xiaomi'),
+    ('Xiaomi Note 10 5G', 'Xiaomi'),
+    ('note 10 for sale', None),
+    ('Redmi 10 2022', 'Xiaomi'),
+    ('Samsung Galaxy Note 10 plus', 'Samsung'),
+    ('Samsung S23 Ultra 256', 'Samsung'),
+    ('Galaxy S23 green', 'Samsung'),
+    ('جالاكسي s23', None),
+    ('iPhone 13 Pro Max', 'Apple - iPhone'),
+]
+
+
+@pytest.mark.parametrize('text, brand, other, other_brand', [
+    ('redmi note 10', None, 'note 10', 'Xiaomi'),
+    ('redmi note 10', None, 'ريدمي نوت 10', None),
+    ('galaxy s23', None, 's23', 'Samsung'),
+    ('galaxy s23', None, 'جالاكسي s23', None),
+])
+def test_family_spellings_share_a_key(text, brand, other, other_brand):
+    key, rest = model_key(text, brand)
+    assert key is not None
+    assert (key, rest) == model_key(other, other_brand)
+
+
+def test_line_separates_models():
+    assert model_key('redmi 10')[0] != model_key('redmi note 10')[0]
+    assert model_key('note 10', 'Samsung')[0] != model_key('note 10', 'Xiaomi')[0]
+
+
+def test_ownerless_model_has_no_key():
+    assert model_key('note 10')[0] is None
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    df = prepare_catalog(pd.DataFrame({
+        'title': [title for title, _ in LISTINGS],
+        'brand': [brand for _, brand in LISTINGS],
+        'price': 10000.0,
+        'location': 'Cairo',
+        'product_url': [f'https://example.com/item/ID{i}.html' for i in range(len(LISTINGS))],
+        'main_image': None,
+        'description': '',
+        'seller_name': 'seller',
+    }))
+    return df, SearchIndex(df)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('xiaomi note 10', [0, 1, 2]),
+    ('redmi note 10', [0, 1, 2]),
+    ('ريدمي نوت 10', [0, 1, 2]),
+    # Without a brand "note 10" has no key and matches title words, including untagged "note 10 for sale"
+    ('note 10', [0, 2, 3, 5]),
+    ('redmi 10', [4]),
+    ('samsung note 10', [5]),
+    ('galaxy s23', [6, 7, 8]),
+    ('samsung s23', [6, 7]),
+])
+def test_model_queries(catalog, query, expected):
+    df, index = catalog
+    results, _ = search_products(df, parse_with_rules(query, partial=True), index)
+    assert sorted(results.index) == expected
@@ -0,0 +1,32 @@
+import json
+import os
+
+import pytest
+
+from result_cache import canonical_query
+from utils import parse_with_rules
+
+# Hand-labelled queries: the filters each should parse to and the tier expected to answer it
+LABELLED_QUERIES = os.path.join(os.path.dirname(__file__), 'labelled_queries.jsonl')
+
+with open(LABELLED_QUERIES, encoding='utf-8') as f:
+    CASES = [json.loads(line) for line in f if line.strip()]
+
+
+def _filters(parsed):
+    return [list(item) for item in canonical_query(parsed)[0]]
+
+
+@pytest.mark.parametrize('case', [case for case in CASES if case['tier'] == 'rules'], ids=lambda case: case['query'])
+def test_rules_match_labels(case):
+    parsed = parse_with_rules(case['query'])
+    assert parsed is not None, "rules left part of the query unresolved"
+    assert _filters(parsed) == case['filters']
+
+
+@pytest.mark.parametrize('case', [case for case in CASES if case['tier'] == 'ner'], ids=lambda case: case['query'])
+def test_unresolved_queries_reach_gliner(case):
+    assert parse_with_rules(case['query']) is None
+    # A degraded answer may miss filters but must never add one the full parse would not have
+    partial = _filters(parse_with_rules(case['query'], partial=True))
+    assert all(item in case['filters'] for item in partial)
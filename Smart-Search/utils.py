@@ -1,58 +1,94 @@
+import numpy as np
+import os
 import pandas as pd
 import re
 import streamlit as st
-from gliner import GLiNER
+import threading
+import time
+from collections import Counter
+
+from attributes import RAM_SIZES, STORAGE_SIZES, enrich_catalog, parse_capacity
+from catalog_analytics import CatalogAnalytics
+from catalog_refresh import Catalog, LiveCatalog, source_mtime
+from catalog_store import compact_catalog, read_catalog
+from constraints import RANGE_COLUMNS, constraint_ranges, extract_constraints, query_ranges, range_label
+from gazetteer import GAZETTEER, canonical_brand, model_key, tag_catalog
+from inference_scheduler import InferenceScheduler
+from listing_entities import load_listing_entities, merge_listing_entities
+from model_loader import BackgroundLoader
+from ner_backend import load_backend
+from normalization import NORMALIZED_COLUMNS, normalize_arabic_numbers, normalize_catalog, normalize_text, tokenize
+from parse_cache import PARSE_CACHE_PATH, ParseCache
+from query_plan import (
+    POSTINGS_COST, SCORING_COST, Predicate, execute, execute_within, order_rows, rank_rows, rows_to_mask, top_rows,
+)
+from result_cache import ResultCache, canonical_query
+from rule_parser import rule_entities
+from search_engine import SearchEngine
+from search_index import SearchIndex
+from semantic_index import EMBEDDINGS_PATH, EmbeddingIndex, encode_query, load_encoder
+from sqlite_engine import SQLiteEngine
+
+# Columns scanned by the free-text filters (storage, RAM, color, condition)
+TEXT_FIELDS = ['title', 'description']
+
+# Define entity labels for extraction
+NER_LABELS = [
+    "BRAND", "MODEL", "STORAGE", "RAM", "BATTERY",
+    "PRICE", "COLOR", "PERCENTAGE", "CONDITION",
+]
+NER_THRESHOLD = 0.3
+NER_MODEL_NAME = "NAMAA-Space/gliner_arabic-v2.1"
+# 'torch' (fp32 PyTorch) or 'onnx' (int8 model exported with `python ner_backend.py export`)
+NER_BACKEND = os.environ.get('NER_BACKEND', 'torch')
+NER_THREADS = int(os.environ.get('NER_THREADS', 0)) or None
+# 'pandas' (catalog held in memory) or 'sqlite' (database built with `python sqlite_engine.py build`)
+SEARCH_ENGINE = os.environ.get('SEARCH_ENGINE', 'pandas')
+# Latency budget for one interactive GLiNER parse; past it the query is answered by the rules (0 disables)
+NER_BUDGET_S = int(os.environ.get('NER_BUDGET_MS', 1500)) / 1000 or None
+# Bump when parse_entities changes shape so stale on-disk parses are not served
+PARSE_VERSION = 5
+# Parsed once right after loading so the first real query does not pay for lazy initialisation
+WARM_UP_QUERY = "ايفون 13 برو 128 جيجا white under 20000"
+
+# How often each tier answered an interactive query in this process
+PARSE_TIERS = Counter()
+_parse_tiers_lock = threading.Lock()
 
 # Cache the model loading
 @st.cache_resource
-def load_ner_model():
-    """Load the GLiNER Arabic NER model"""
-    return GLiNER.from_pretrained("NAMAA-Space/gliner_arabic-v2.1")
+def load_ner_model(backend=NER_BACKEND, threads=NER_THREADS):
+    """Load the GLiNER Arabic NER model on the configured inference backend"""
+    return load_backend(NER_MODEL_NAME, backend, threads=threads)
 
-def normalize_arabic_numbers(text):
-    """Convert Arabic numerals to Western numerals"""
-    arabic_to_western = str.maketrans('٠١٢٣٤٥٦٧٨٩', '0123456789')
-    return text.translate(arabic_to_western)
+def _warm_up(scheduler):
+    scheduler.predict_entities(WARM_UP_QUERY, NER_LABELS, threshold=NER_THRESHOLD)
+
+@st.cache_resource
+def load_model_loader():
+    """Start loading and warming the shared GLiNER scheduler on a background thread"""
+    # The worker thread has no Streamlit script context, so it builds the model directly
+    return BackgroundLoader(
+        lambda: InferenceScheduler(
+            load_backend(NER_MODEL_NAME, NER_BACKEND, threads=NER_THREADS), max_batch_size=16, max_wait_ms=5
+        ),
+        warm_up=_warm_up,
+        name='ner-loader',
+    )
+
+@st.cache_resource
+def load_parse_cache():
+    """On-disk parse cache for the current model, label set and threshold"""
+    # The quantized backend can tag slightly differently, so each backend keeps its own entries
+    return ParseCache(PARSE_CACHE_PATH, f"{NER_MODEL_NAME}:{NER_BACKEND}:v{PARSE_VERSION}", NER_LABELS, NER_THRESHOLD)
 
 def extract_price_limit(text):
-    """Extract price limit from text using patterns"""
-    text = normalize_arabic_numbers(text.lower())
-    
-    # Patterns for price limits
-    patterns = [
-        r'(?:under|less than|below|<|اقل من|تحت|أقل من)\s*(\d+)\s*(?:k|الف|ألف)?',
-        r'(\d+)\s*(?:k|الف|ألف)?\s*(?:or less|maximum|max|حد أقصى)',
-        r'budget\s*(\d+)\s*(?:k|الف|ألف)?',
-        r'up to\s*(\d+)\s*(?:k|الف|ألف)?'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            price = int(match.group(1))
-            # If 'k' or equivalent, multiply by 1000
-            if 'k' in match.group(0) or 'الف' in match.group(0) or 'ألف' in match.group(0):
-                price *= 1000
-            return price
-    return None
+    """Extract the upper price bound from text"""
+    return constraint_ranges(extract_constraints(text)).get('price', [None, None])[1]
 
 def extract_battery_percentage(text):
-    """Extract battery percentage from text"""
-    text = normalize_arabic_numbers(text)
-    
-    patterns = [
-        r'(?:battery|بطاريه|بطارية)\s*(\d+)%',
-        r'(\d+)%\s*(?:battery|بطاريه|بطارية)',
-        r'(\d+)\s*%'  # Simple percentage
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            percentage = int(match.group(1))
-            if 0 <= percentage <= 100:
-                return percentage
-    return None
+    """Extract the minimum battery percentage from text"""
+    return constraint_ranges(extract_constraints(text)).get('battery', [None, None])[0]
 
 def normalize_entities(entities):
     """Normalize and deduplicate entities by taking the one with highest score for each type"""
@@ -75,21 +111,132 @@ def normalize_entities(entities):
     
     return normalized_entities
 
-def parse_query_with_ner(query, model):
-    """Parse query using GLiNER NER model and regex patterns"""
+def parse_with_rules(query, partial=False):
+    """Parse a query with the deterministic extractor, or None if it leaves anything unresolved
+
+    With partial=True whatever the rules found is returned anyway, for use while GLiNER is unavailable.
+    """
+    entities, unresolved = rule_entities(query)
+    if partial:
+        parsed = parse_entities(query, entities)
+        parsed['tier'] = 'fallback'
+        return parsed
+    if not entities or unresolved:
+        return None
+    parsed = parse_entities(query, entities)
+    parsed['tier'] = 'rules'
+    return parsed
+
+def _predict_within(model, query, remaining):
+    """GLiNER entities for a query, or None if they cannot arrive within remaining seconds"""
+    # Only the shared scheduler can give up on a request; a bare model always runs to completion
+    if not isinstance(model, InferenceScheduler):
+        return model.predict_entities(query, NER_LABELS, threshold=NER_THRESHOLD)
+    # A backed-up queue is skipped without queuing the request at all
+    if remaining <= 0 or model.expected_wait() > remaining:
+        return None
+    try:
+        return model.predict_entities(query, NER_LABELS, threshold=NER_THRESHOLD, timeout=remaining)
+    except TimeoutError:
+        return None
+
+def parse_query_with_ner(query, model, cache=None, rules=True, budget=None):
+    """Parse query using GLiNER NER model and regex patterns
+
+    With a budget in seconds, a query GLiNER cannot answer in time gets the rule-based parse flagged as degraded.
+    """
     
-    # Define entity labels for extraction
-    labels = [
-        "BRAND", "MODEL", "STORAGE", "RAM", "BATTERY",
-        "PRICE", "COLOR", "PERCENTAGE", "CONDITION",
-    ]
+    start = time.perf_counter()
     query = query.replace(',', '')
-    # Extract entities using GLiNER
-    raw_entities = model.predict_entities(query, labels, threshold=0.3)
+    # Queries the rules fully account for never reach GLiNER
+    parsed = parse_with_rules(query) if rules else None
+    # Queries parsed before (in this or an earlier run) skip the model entirely
+    if parsed is None and cache is not None:
+        parsed = cache.get(query)
+        if parsed is not None:
+            parsed['tier'] = 'cache'
+    # No model yet (still loading in the background): answer with the rules rather than block
+    if parsed is None and model is None:
+        parsed = parse_with_rules(query, partial=True)
+    if parsed is None:
+        # Extract entities using GLiNER (or an InferenceScheduler that batches the call with other sessions)
+        if budget is None:
+            raw_entities = model.predict_entities(query, NER_LABELS, threshold=NER_THRESHOLD)
+        else:
+            raw_entities = _predict_within(model, query, budget - (time.perf_counter() - start))
+        if raw_entities is None:
+            # Over budget: regex constraints plus whatever entities the rules found, never cached
+            parsed = parse_with_rules(query, partial=True)
+            parsed['tier'] = 'degraded'
+        else:
+            parsed = parse_entities(query, raw_entities)
+            parsed['tier'] = 'ner'
+            if cache is not None:
+                cache.put(query, parsed)
+    parsed['degraded'] = parsed['tier'] == 'degraded'
+    
+    with _parse_tiers_lock:
+        PARSE_TIERS[parsed['tier']] += 1
+    print(f"Extracted Entities ({parsed['tier']}):", parsed['entities_found'])
+    return parsed
+
+def parse_tier_stats():
+    """Queries answered per tier in this process and the share that was degraded"""
+    with _parse_tiers_lock:
+        counts = dict(PARSE_TIERS)
+    total = sum(counts.values())
+    return {
+        'tiers': counts,
+        'total': total,
+        'degraded': counts.get('degraded', 0),
+        'degraded_rate': counts.get('degraded', 0) / total if total else 0.0,
+    }
 
+def parse_queries_with_ner(queries, model, batch_size=32, cache=None, rules=True):
+    """Parse many queries with batched GLiNER inference, running each distinct query once"""
+    
+    cleaned = [query.replace(',', '') for query in queries]
+    unique_queries = list(dict.fromkeys(cleaned))
+    
+    parsed_by_query = {}
+    if rules:
+        for query in unique_queries:
+            parsed = parse_with_rules(query)
+            if parsed is not None:
+                parsed_by_query[query] = parsed
+        unique_queries = [query for query in unique_queries if query not in parsed_by_query]
+    
+    if cache is not None:
+        for query in unique_queries:
+            parsed = cache.get(query)
+            if parsed is not None:
+                parsed['tier'] = 'cache'
+                parsed_by_query[query] = parsed
+        unique_queries = [query for query in unique_queries if query not in parsed_by_query]
+    
+    if model is None:
+        for query in unique_queries:
+            parsed_by_query[query] = parse_with_rules(query, partial=True)
+        unique_queries = []
+    
+    for start in range(0, len(unique_queries), batch_size):
+        batch = unique_queries[start:start + batch_size]
+        batch_entities = model.batch_predict_entities(batch, NER_LABELS, threshold=NER_THRESHOLD)
+        for query, raw_entities in zip(batch, batch_entities):
+            parsed_by_query[query] = parse_entities(query, raw_entities)
+            parsed_by_query[query]['tier'] = 'ner'
+            if cache is not None:
+                cache.put(query, parsed_by_query[query])
+    
+    return [parsed_by_query[query] for query in cleaned]
+
+def parse_entities(query, raw_entities):
+    """Build the parsed query dict from GLiNER entities and regex patterns"""
+    
     # Normalize and deduplicate entities
     entities = normalize_entities(raw_entities)
-    print("Extracted Entities:", entities)
+    # Numeric min/max/between bounds come from the constraint lexer, not from entity text
+    ranges = constraint_ranges(extract_constraints(query))
     # Initialize result
     parsed = {
         'raw_query': query,
@@ -101,33 +248,18 @@ def parse_query_with_ner(query, model):
         'price_max': None,
         'battery_min': None,
         'condition': None,
+        'ranges': ranges,
         'entities_found': entities
     }
     
     # Process NER entities
     for entity in entities:
-        entity_text = entity['text'].lower()
+        entity_text = normalize_text(entity['text'])
         entity_label = entity['label']
         
         if entity_label == 'BRAND':
-            # Brand mapping
-            brand_mapping = {
-                'iphone': 'Apple', 'ايفون': 'Apple', 'apple': 'Apple',
-                'samsung': 'Samsung', 'سامسونج': 'Samsung',
-                'huawei': 'Huawei', 'هواوي': 'Huawei',
-                'xiaomi': 'Xiaomi', 'شاومي': 'Xiaomi',
-                'oppo': 'OPPO', 'اوبو': 'OPPO',
-                'oneplus': 'OnePlus', 'ون بلس': 'OnePlus'
-            }
-            
-            for key, brand in brand_mapping.items():
-                if key in entity_text:
-                    parsed['brand'] = brand
-                    break
-            
-            # If no mapping found, use the extracted text
-            if not parsed['brand']:
-                parsed['brand'] = entity['text']
+            # Brand mapping through the gazetteer; if no mapping found, use the extracted text
+            parsed['brand'] = canonical_brand(entity_text) or entity['text']
         
         elif entity_label == 'MODEL':
             parsed['model'] = entity['text']
@@ -140,7 +272,7 @@ def parse_query_with_ner(query, model):
             # Add RAM extraction (e.g., "8GB RAM", "6GB", etc.)
             parsed['ram'] = entity['text']
         
-        elif entity_label == 'BATTERY':
+        elif entity_label == 'BATTERY' and 'battery' not in ranges:
             # Extract battery info from NER and try to get percentage
             battery_text = entity['text']
             # Try to extract percentage from NER result
@@ -159,130 +291,384 @@ def parse_query_with_ner(query, model):
         elif entity_label == 'CONDITION':
             parsed['condition'] = entity['text']
     
-    # Extract price limit using regex
-    parsed['price_max'] = extract_price_limit(query)
-    
-    # Extract battery percentage using regex (if not already found by NER)
-    if not parsed['battery_min']:
-        battery_percent = extract_battery_percentage(query)
-        if battery_percent:
-            parsed['battery_min'] = battery_percent
+    # Upper price and lower battery bounds are also kept as scalars for display
+    parsed['price_max'] = ranges.get('price', [None, None])[1]
+    if 'battery' in ranges:
+        parsed['battery_min'] = ranges['battery'][0]
     
     return parsed
 
-def search_products(df, parsed_query):
-    """Filter products based on parsed query"""
+def _numeric(df, column, rows=None):
+    """Column as a float array with NaN for missing values, for every row or only the given positions"""
+    values = df[column] if rows is None else df[column].take(rows)
+    return values.to_numpy(dtype='float64', na_value=np.nan)
+
+def _select(matches, size, rows=None):
+    """Mask of matching row positions over the whole catalog, or over the given rows only"""
+    if rows is None:
+        return rows_to_mask(matches, size)
+    return np.isin(rows, matches)
+
+def _text_predicate(index, label, text, fields):
+    """Predicate that matches rows through the token index"""
+    def evaluate(rows=None):
+        return _select(index.tokens.match(text, fields), index.size, rows)
+    return Predicate(
+        label,
+        evaluate,
+        cost=POSTINGS_COST,
+        selectivity=index.tokens.estimate(text, fields) / max(index.size, 1),
+        within=evaluate,
+    )
+
+def _range_predicate(df, field, low, high):
+    """Predicate comparing a numeric column against inclusive bounds (missing values never match)"""
+    def evaluate(rows=None):
+        values = _numeric(df, RANGE_COLUMNS[field], rows)
+        mask = np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+    return Predicate(range_label(field, low, high), evaluate, within=evaluate)
+
+def _spelling_rows(index, surfaces, fields):
+    """Sorted rows matching any one of several spellings"""
+    return np.unique(np.concatenate([index.tokens.match(surface, fields) for surface in surfaces]))
+
+def _category_predicate(index, label, column, value):
+    """Predicate comparing category codes of a tagged catalog column"""
+    return Predicate(
+        label,
+        lambda: index.category_mask(column, value),
+        selectivity=index.category_count(column, value) / max(index.size, 1),
+        within=lambda rows: index.category_mask(column, value, rows),
+    )
+
+def _synonym_predicate(index, label, label_type, text, fields):
+    """Predicate matching any gazetteer spelling of text ("black", "اسود", "بلاك")"""
+    canonical = GAZETTEER.first(text, label_type)
+    surfaces = GAZETTEER.synonyms[label_type, canonical] if canonical else [text]
+    value = canonical or normalize_text(text)
+    column = f"{label_type.lower()}_key"
+    def evaluate(rows=None):
+        mask = _select(_spelling_rows(index, surfaces, fields), index.size, rows)
+        if index.has_column(column):
+            # Listings tagged offline compare the column; only untagged ones fall back to their text
+            mask = index.category_mask(column, value, rows) | (index.category_missing(column, rows) & mask)
+        return mask
+    return Predicate(
+        label,
+        evaluate,
+        cost=POSTINGS_COST,
+        selectivity=min(sum(index.tokens.estimate(surface, fields) for surface in surfaces) / max(index.size, 1), 1.0),
+        within=evaluate,
+    )
+
+def _model_predicate(index, label, model, brand=None):
+    """Model key comparison on the tagged catalog, plus title words the key does not cover ("pro", "ماكس")"""
+    key, rest = model_key(model, brand)
+    if key is None or not index.has_category('model_key', key):
+        return _text_predicate(index, label, model, ['title'])
+    # Suffixes match in either language, other leftover words as written
+    spellings = [GAZETTEER.synonyms.get(('SUFFIX', GAZETTEER.first(token, 'SUFFIX')), [token]) for token in rest]
+    def evaluate(rows=None):
+        # Listings the tagger found no model in still match on the model's words in their title
+        mask = index.category_mask('model_key', key, rows) | (
+            index.category_missing('model_key', rows) & _select(index.tokens.match(model, ['title']), index.size, rows)
+        )
+        for surfaces in spellings:
+            mask &= _select(_spelling_rows(index, surfaces, ['title']), index.size, rows)
+        return mask
+    return Predicate(
+        label, evaluate, selectivity=index.category_count('model_key', key) / max(index.size, 1), within=evaluate
+    )
+
+def _fuzzy_predicate(index, label, lookup):
+    """Predicate over rows returned by a trigram similarity lookup"""
+    def evaluate(rows=None):
+        return _select(lookup(), index.size, rows)
+    return Predicate(label, evaluate, cost=POSTINGS_COST, within=evaluate)
+
+def _equals_predicate(df, label, column, value):
+    """Predicate comparing a numeric column with one value (missing values never match)"""
+    def evaluate(rows=None):
+        return _numeric(df, column, rows) == value
+    return Predicate(label, evaluate, within=evaluate)
+
+def build_predicates(df, parsed_query, index, fuzzy=False):
+    """Describe the structured filters of a parsed query as predicates over the catalog"""
     
-    filtered_df = df.copy()
-    applied_filters = []
+    # Predicates are only described here; execute() decides the order and builds one mask
+    predicates = []
+    ranges = query_ranges(parsed_query)
     
-    # Filter by brand
+    # Filter by brand (trigram similarity over brand names in fuzzy mode)
     if parsed_query['brand']:
-        brand_filter = filtered_df['brand'].str.contains(
-            parsed_query['brand'], case=False, na=False
-        )
-        filtered_df = filtered_df[brand_filter]
-        applied_filters.append(f"Brand: {parsed_query['brand']}")
+        brand = parsed_query['brand']
+        if fuzzy:
+            predicates.append(_fuzzy_predicate(index, f"Brand ≈ {brand}", lambda: index.fuzzy_brand_rows(brand)))
+        elif index.has_category('brand_key', canonical_brand(brand) or brand):
+            # Brands tagged at load time compare category codes instead of brand text
+            predicates.append(_category_predicate(index, f"Brand: {brand}", 'brand_key', canonical_brand(brand) or brand))
+        else:
+            predicates.append(_text_predicate(index, f"Brand: {brand}", brand, ['brand']))
     
-    # Filter by model/product (search in title)
+    # Filter by model/product (search in title, trigram similarity in fuzzy mode)
     if parsed_query['model']:
-        model_filter = filtered_df['title'].str.contains(
-            parsed_query['model'], case=False, na=False
-        )
-        filtered_df = filtered_df[model_filter]
-        applied_filters.append(f"Model: {parsed_query['model']}")
-    
-    # Filter by storage (search in title/description)
-    if parsed_query['storage']:
-        storage_filter = (
-            filtered_df['title'].str.contains(parsed_query['storage'], case=False, na=False) |
-            filtered_df['description'].str.contains(parsed_query['storage'], case=False, na=False)
-        )
-        filtered_df = filtered_df[storage_filter]
-        applied_filters.append(f"Storage: {parsed_query['storage']}")
-    
-    # Filter by RAM (search in title/description)
-    if parsed_query['ram']:
-        ram_filter = (
-            filtered_df['title'].str.contains(parsed_query['ram'], case=False, na=False) |
-            filtered_df['description'].str.contains(parsed_query['ram'], case=False, na=False)
-        )
-        filtered_df = filtered_df[ram_filter]
-        applied_filters.append(f"RAM: {parsed_query['ram']}")
+        model = parsed_query['model']
+        if fuzzy:
+            predicates.append(_fuzzy_predicate(index, f"Model ≈ {model}", lambda: index.fuzzy_title_rows(model)))
+        else:
+            predicates.append(_model_predicate(index, f"Model: {model}", model, parsed_query['brand']))
+    
+    # Filter by storage (numeric column, text search if the entity has no capacity); a range replaces it
+    if parsed_query['storage'] and 'storage' not in ranges:
+        label = f"Storage: {parsed_query['storage']}"
+        storage_gb = parse_capacity(parsed_query['storage'])
+        if storage_gb in STORAGE_SIZES:
+            predicates.append(_equals_predicate(df, label, 'storage_gb', storage_gb))
+        else:
+            predicates.append(_text_predicate(index, label, parsed_query['storage'], TEXT_FIELDS))
     
-    # Filter by color (search in title/description)
+    # Filter by RAM (numeric column, text search if the entity has no size); a range replaces it
+    if parsed_query['ram'] and 'ram' not in ranges:
+        label = f"RAM: {parsed_query['ram']}"
+        ram_gb = parse_capacity(parsed_query['ram'])
+        if ram_gb in RAM_SIZES:
+            predicates.append(_equals_predicate(df, label, 'ram_gb', ram_gb))
+        else:
+            predicates.append(_text_predicate(index, label, parsed_query['ram'], TEXT_FIELDS))
+    
+    # Filter by color (any spelling of it in title/description)
     if parsed_query['color']:
-        color_filter = (
-            filtered_df['title'].str.contains(parsed_query['color'], case=False, na=False) |
-            filtered_df['description'].str.contains(parsed_query['color'], case=False, na=False)
-        )
-        filtered_df = filtered_df[color_filter]
-        applied_filters.append(f"Color: {parsed_query['color']}")
-    
-    # Filter by price limit
-    if parsed_query['price_max']:
-        price_filter = filtered_df['price'] <= parsed_query['price_max']
-        filtered_df = filtered_df[price_filter]
-        applied_filters.append(f"Price ≤ {parsed_query['price_max']:,} EGP")
-    
-    # Filter by minimum battery percentage (search in description for batteries >= battery_min)
-    if parsed_query['battery_min']:
-        # Extract all battery percentages from descriptions and filter for >= battery_min
-        def check_battery_condition(description):
-            if pd.isna(description):
-                return False
-            # Find all battery percentages in the description
-            battery_matches = re.findall(r'(\d+)%', str(description))
-            if battery_matches:
-                # Check if any battery percentage is >= the minimum required
-                battery_percentages = [int(match) for match in battery_matches if match.isdigit()]
-                return any(percentage >= parsed_query['battery_min'] for percentage in battery_percentages)
-            return False
-        
-        battery_filter = filtered_df['description'].apply(check_battery_condition)
-        filtered_df = filtered_df[battery_filter]
-        applied_filters.append(f"Battery ≥ {parsed_query['battery_min']}%")
+        predicates.append(_synonym_predicate(index, f"Color: {parsed_query['color']}", 'COLOR', parsed_query['color'], TEXT_FIELDS))
+    
+    # Price, battery, storage and RAM bounds (battery_pct, storage_gb and ram_gb are parsed at load time)
+    for field, (low, high) in ranges.items():
+        predicates.append(_range_predicate(df, field, low, high))
     
     # Handle raw battery text from NER (if no percentage found)
-    elif 'battery_raw' in parsed_query and parsed_query['battery_raw']:
-        battery_filter = filtered_df['description'].str.contains(
-            parsed_query['battery_raw'], case=False, na=False
-        )
-        filtered_df = filtered_df[battery_filter]
-        applied_filters.append(f"Battery: {parsed_query['battery_raw']}")
+    if 'battery' not in ranges and parsed_query.get('battery_raw'):
+        predicates.append(_text_predicate(index, f"Battery: {parsed_query['battery_raw']}", parsed_query['battery_raw'], ['description']))
     
     # Filter by condition
     if parsed_query['condition']:
-        condition_filter = (
-            filtered_df['title'].str.contains(parsed_query['condition'], case=False, na=False) |
-            filtered_df['description'].str.contains(parsed_query['condition'], case=False, na=False)
-        )
-        filtered_df = filtered_df[condition_filter]
-        applied_filters.append(f"Condition: {parsed_query['condition']}")
-    
-    # Simple text search in title and description for remaining terms (only if no filters applied)
-    if not applied_filters:
-        query_lower = parsed_query['raw_query'].lower()
-        if query_lower.split():  # Check if query has words
-            first_word = query_lower.split()[0]
-            text_filter = (
-                filtered_df['title'].str.lower().str.contains(first_word, na=False) |
-                filtered_df['description'].str.lower().str.contains(first_word, na=False)
-            )
-            filtered_df = filtered_df[text_filter]
-            applied_filters.append(f"Text search: '{first_word}'")
+        predicates.append(_synonym_predicate(index, f"Condition: {parsed_query['condition']}", 'CONDITION', parsed_query['condition'], TEXT_FIELDS))
+    
+    return predicates
+
+def _partition_rows(parsed_query, index, fuzzy=False):
+    """Rows of the partitions the parsed brand and price bounds can match, or None if they prune nothing"""
+    brand = parsed_query['brand']
+    # Only an exact brand compared by category code pins a partition; text and fuzzy brand matches do not
+    brand_code = index.category_code('brand_key', canonical_brand(brand) or brand) if brand and not fuzzy else None
+    low, high = query_ranges(parsed_query).get('price', (None, None))
+    return index.partitions.prune(brand_code, low, high)
+
+def filter_catalog(df, parsed_query, index, limit=None, offset=0, order_by=None, fuzzy=False, memo=None):
+    """Evaluate a parsed query over the in-memory catalog with the token, category and sort indexes"""
+    
+    predicates = build_predicates(df, parsed_query, index, fuzzy)
+    
+    # No structured filter recognized: rank every query term with BM25 instead
+    scores = None
+    if not predicates and tokenize(parsed_query['raw_query']):
+        scores = index.bm25.score(parsed_query['raw_query'])
+        predicates.append(Predicate(
+            f"Text relevance: '{parsed_query['raw_query']}'", lambda: scores > 0, cost=SCORING_COST
+        ))
+        order_by = order_by or 'relevance'
+    order_by = order_by or 'price_desc'
+    
+    applied_filters = [predicate.label for predicate in predicates]
+    candidates = _partition_rows(parsed_query, index, fuzzy)
+    if candidates is None:
+        mask = execute(predicates, len(df), memo)
+        # Rows deleted or superseded by a refresh stay in the frame until the next rebuild
+        if index.live is not None:
+            mask = mask & index.live
+        matches = None
+    else:
+        # Brand and price bounds already ruled out the other partitions; predicates only test these rows
+        matches = execute_within(predicates, candidates, memo)
+        if index.live is not None:
+            matches = matches[index.live[matches]]
+        mask = rows_to_mask(matches, len(df)) if order_by == 'relevance' else None
     
-    # Sort by price (descending)
-    filtered_df = filtered_df.sort_values('price', ascending=False)
+    # Relevance ranks by BM25 score, every other ordering follows a presorted permutation
+    if order_by == 'relevance':
+        if scores is None:
+            scores = index.bm25.score(parsed_query['raw_query'])
+        rows = rank_rows(mask, scores, limit, offset)
+    elif matches is not None:
+        rows = order_rows(matches, index.ordering_ranks(order_by), limit, offset)
+    else:
+        rows = top_rows(mask, index.ordering(order_by), limit, offset)
+    filtered_df = df.take(rows)
+    # The page may be shorter than the match set, so report the full count alongside it
+    filtered_df.attrs['total_matches'] = len(matches) if matches is not None else int(np.count_nonzero(mask))
 
     return filtered_df, applied_filters
 
-@st.cache_data
+class PandasEngine(SearchEngine):
+    """Default engine: vectorized predicates over the catalog frame held in memory"""
+
+    name = 'pandas'
+
+    def __init__(self, df, index=None):
+        self.df = df
+        self.index = SearchIndex(df) if index is None else index
+
+    @property
+    def version(self):
+        return self.index.version
+
+    def search(self, parsed_query, limit=None, offset=0, order_by=None, fuzzy=False, memo=None):
+        return filter_catalog(self.df, parsed_query, self.index, limit, offset, order_by, fuzzy, memo)
+
+def search_products(df, parsed_query, index=None, limit=None, offset=0, order_by=None, fuzzy=False, cache=None, memo=None, engine=None):
+    """Filter products based on parsed query and return one page of results"""
+    
+    # Without an explicit engine the query runs over df in memory
+    if engine is None:
+        engine = PandasEngine(df, index)
+    
+    # Different phrasings that parse to the same filters share one cache entry
+    if cache is not None:
+        key = (canonical_query(parsed_query, order_by), limit, offset, order_by, fuzzy)
+        cached = cache.get(engine.version, key)
+        if cached is None:
+            cached = engine.search(parsed_query, limit, offset, order_by, fuzzy)
+            cache.put(engine.version, key, cached)
+        results, applied_filters = cached
+        return results, list(applied_filters)
+    
+    return engine.search(parsed_query, limit, offset, order_by, fuzzy, memo)
+
+def semantic_search(df, parsed_query, index, embeddings, encoder, k=50, hybrid=True, fuzzy=False):
+    """Rank listings by embedding similarity to the query, within the structured filters when hybrid"""
+    
+    predicates = build_predicates(df, parsed_query, index, fuzzy) if hybrid else []
+    mask = execute(predicates, len(df)) if predicates else None
+    if index.live is not None:
+        mask = index.live if mask is None else mask & index.live
+    if mask is not None:
+        # Rows appended by a refresh have no embedding until `python semantic_index.py` is rerun
+        mask = mask[:embeddings.size]
+    
+    rows, similarity = embeddings.search(encode_query(encoder, parsed_query['raw_query']), k, mask)
+    results = df.take(rows)
+    results['similarity'] = similarity
+    results.attrs['total_matches'] = len(rows)
+    
+    applied_filters = [predicate.label for predicate in predicates]
+    applied_filters.append(f"Semantic top {k}")
+    return results, applied_filters
+
+def search_many(queries, model, df, index, batch_size=32, limit=None, order_by=None, fuzzy=False, output_path=None, parse_cache=None, engine=None):
+    """Parse and search a list of queries in bulk, returning (results, applied_filters) per query"""
+    
+    parsed_queries = parse_queries_with_ner(queries, model, batch_size, cache=parse_cache)
+    
+    # Identical filter sets are searched once, and every distinct predicate mask is computed once
+    by_key = {}
+    memo = {}
+    outcomes = []
+    for parsed in parsed_queries:
+        key = canonical_query(parsed, order_by)
+        if key not in by_key:
+            by_key[key] = search_products(
+                df, parsed, index, limit=limit, order_by=order_by, fuzzy=fuzzy, memo=memo, engine=engine
+            )
+        outcomes.append(by_key[key])
+    
+    if output_path:
+        write_results(combine_results(queries, outcomes), output_path)
+    return outcomes
+
+def export_frame(results):
+    """Results without the derived normalized text columns"""
+    return results.drop(columns=[column for column in NORMALIZED_COLUMNS.values() if column in results.columns])
+
+def combine_results(queries, outcomes):
+    """Stack per-query results into one frame tagged with the originating query"""
+    frames = [
+        export_frame(results).assign(query_index=position, query=query)
+        for position, (query, (results, _)) in enumerate(zip(queries, outcomes))
+    ]
+    if not frames:
+        return pd.DataFrame(columns=['query_index', 'query'])
+    combined = pd.concat(frames, ignore_index=True)
+    leading = ['query_index', 'query']
+    return combined[leading + [column for column in combined.columns if column not in leading]]
+
+def write_results(combined, output_path):
+    """Write combined results as Parquet or CSV, chosen by file extension"""
+    if output_path.endswith('.parquet'):
+        combined.to_parquet(output_path, index=False)
+    else:
+        combined.to_csv(output_path, index=False, encoding='utf-8')
+
+def prepare_catalog(df, entities=None):
+    """Normalize text, parse storage/RAM/battery and tag brand/model keys once, queries only touch the results"""
+    df = tag_catalog(enrich_catalog(normalize_catalog(df)))
+    if entities is not None:
+        df = merge_listing_entities(df, entities)
+    # One compact copy per process instead of a pickled copy per caller
+    return compact_catalog(df)
+
+@st.cache_resource
 def load_data():
-    """Load the cleaned dataset"""
+    """Load the cleaned dataset, shared read-only by every session (callers must not modify it)"""
     try:
-        df = pd.read_csv('data/olx_products_cleaned.csv')
-        return df
+        # Arrow/Parquet copies written by `python catalog_store.py convert` load faster than the CSV.
+        # Every column is read: result cards show them all and a refresh hashes them to detect changed listings;
+        # the dashboard works on the ANALYTICS_COLUMNS subset of this same frame instead of a second copy
+        df = read_catalog()
+        # Entities extracted offline with `python listing_entities.py` fill the gaps and add color/condition keys
+        return prepare_catalog(df, load_listing_entities(df))
     except FileNotFoundError:
         st.error("Dataset not found. Please ensure 'data/olx_products_cleaned.csv' exists.")
         return pd.DataFrame()
+
+@st.cache_resource
+def load_search_index():
+    """Build the token index, BM25 matrix and sort permutations once over the loaded dataset"""
+    return SearchIndex(load_data())
+
+@st.cache_resource
+def load_live_catalog():
+    """Current catalog version and its index, merged incrementally when a new snapshot is published"""
+    return LiveCatalog(Catalog(load_data(), load_search_index(), mtime=source_mtime()), prepare_catalog)
+
+@st.cache_resource
+def load_search_engine():
+    """The SQLite engine when SEARCH_ENGINE=sqlite, else None so searches run over the in-memory catalog"""
+    if SEARCH_ENGINE == 'sqlite':
+        return SQLiteEngine()
+    return None
+
+@st.cache_resource(max_entries=2)
+def load_catalog_analytics(version, _listings):
+    """Dashboard aggregations for one dataset version; a refreshed catalog gets its own entry"""
+    return CatalogAnalytics(_listings, version)
+
+@st.cache_resource
+def load_result_cache():
+    """Search result cache shared by every session of this process"""
+    return ResultCache(maxsize=256, ttl=600)
+
+@st.cache_resource
+def load_embedding_index():
+    """Memory-map the listing embeddings, or None if they are missing or built for another dataset"""
+    if not os.path.exists(EMBEDDINGS_PATH):
+        return None
+    embeddings = EmbeddingIndex(EMBEDDINGS_PATH)
+    return embeddings if embeddings.matches(load_data()) else None
+
+@st.cache_resource
+def load_embedding_model():
+    """Load the sentence-embedding model used to encode queries"""
+    return load_encoder()